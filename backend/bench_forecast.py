@@ -0,0 +1,307 @@
+"""Rolling-origin backtest and latency benchmark for the forecasting engines.
+
+Generates synthetic DailyActivity histories (items x days with weekly and
+yearly seasonality, trend and Poisson noise), folds them into daily_sales
+shaped rollups and, for each fold, trains every engine on the history before
+the cutoff and forecasts the next --horizon days. (engine, fold) tasks run in
+parallel in a process pool, each in a fresh worker process, so its peak RSS
+belongs to that fold alone. RSS includes native allocations (XGBoost, BLAS,
+statsmodels), which tracemalloc can't see. Prophet's Stan fits run in
+separate cmdstan processes and aren't counted. The JSON report holds
+fit/predict seconds, peak RSS (and how much the engine added on top of the
+loaded fold) and MAPE per engine so runs can be compared over time:
+
+    python bench_forecast.py --items 50 --days 365 --folds 4 --out forecast_report.json
+    python bench_forecast.py --engines fast,xgboost --items 2000
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import fast_forecast
+import forecasting
+import rollups
+import xgb_forecast
+
+ENGINES = ["prophet", "arima", "xgboost", "fast"]
+WEATHER = ["Sunny", "Cloudy", "Rainy"]
+
+
+def synthetic_activity(items, days, lines, weekly, yearly, seed=0, end="2025-12-31"):
+    """DailyActivity-shaped rows: `lines` order lines per item per day that had sales."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end, periods=days, freq="D")
+    position = np.arange(days)
+    base = rng.lognormal(mean=2.5, sigma=0.8, size=items)[:, None]
+    trend = 1.0 + rng.normal(0.0, 0.3, items)[:, None] * position[None, :] / days
+    week = 1.0 + weekly * (dates.dayofweek.to_numpy() >= 5)
+    year = 1.0 + yearly * np.sin(2 * np.pi * (dates.dayofyear.to_numpy() + rng.integers(0, 365, items)[:, None]) / 365.25)
+    start = rng.integers(0, max(days // 3, 1), items)  # Dishes join the menu at different times
+    demand = base * trend * week[None, :] * year
+    demand[position[None, :] < start[:, None]] = 0.0
+    quantity = rng.poisson(np.clip(demand, 0, None))
+
+    # ✅ Spread each item-day's sales over `lines` order lines
+    item, day = np.nonzero(quantity)
+    split = rng.multinomial(quantity[item, day], [1.0 / lines] * lines)
+    line_item, line_day = np.repeat(item, lines), np.repeat(day, lines)
+    amount = split.ravel()
+    sold = amount > 0
+    hours = rng.integers(9, 22, sold.sum())
+    activity = pd.DataFrame({
+        "Date_Time": dates[line_day[sold]] + pd.to_timedelta(hours, unit="h"),
+        "Item_Name": np.char.add("Dish ", np.char.zfill(line_item[sold].astype(str), 5)),
+        "Quantity_Sold": amount[sold],
+    })
+    activity["Revenue"] = activity["Quantity_Sold"] * 9.5
+    activity["Customer_Count"] = 1
+    activity["Day_Type"] = np.where(activity["Date_Time"].dt.dayofweek >= 5, "Weekend", "Weekday")
+    weather = rng.choice(WEATHER, days)
+    activity["Weather_Condition"] = weather[(activity["Date_Time"].dt.normalize() - dates[0]).dt.days]
+    return activity
+
+
+def fold_rollups(activity):
+    """The daily_sales rollups rollups.record would maintain for `activity`, as a sales frame."""
+    activity = activity.assign(Date=activity["Date_Time"].dt.normalize())
+    sales = activity.groupby(["Item_Name", "Date"], as_index=False).agg(
+        Quantity_Sold=("Quantity_Sold", "sum"),
+        Revenue=("Revenue", "sum"),
+        Customer_Count=("Customer_Count", "sum"),
+        Order_Lines=("Quantity_Sold", "size"),
+        Day_Type=("Day_Type", "max"),
+        Weather_Condition=("Weather_Condition", "max"),
+    )
+    return sales[rollups.ROLLUP_COLUMNS]
+
+
+def eligible(train):
+    """Items every engine forecasts: Prophet's minimum history applies to all for a fair MAPE."""
+    lines = train.groupby("Item_Name")["Order_Lines"].sum()
+    return sorted(lines[lines >= forecasting.MIN_ROWS_PER_ITEM].index)
+
+
+def run_prophet(train, future):
+    from prophet import Prophet
+
+    models, fit_seconds = {}, 0.0
+    for item, item_sales in train.groupby("Item_Name", sort=True):
+        started = time.perf_counter()
+        model = Prophet(daily_seasonality=True, weekly_seasonality=True)
+        model.add_regressor("weekend")
+        model.fit(forecasting.daily_series(item_sales))
+        fit_seconds += time.perf_counter() - started
+        models[item] = model
+
+    started = time.perf_counter()
+    frame = pd.DataFrame({"ds": future, "weekend": (future.dayofweek >= 5).astype(int)})
+    predictions = {item: np.rint(model.predict(frame)["yhat"].to_numpy()) for item, model in models.items()}
+    return predictions, fit_seconds, time.perf_counter() - started
+
+
+def run_arima(train, future):
+    from statsmodels.tsa.arima.model import ARIMA
+
+    items, dates, matrix = rollups.sales_matrix(train, end=future[0] - pd.Timedelta(days=1))  # Through the day before the cutoff, like fast_forecast.history
+    weekend = (dates.dayofweek >= 5).astype(float)
+    ahead = pd.date_range(dates[-1] + pd.Timedelta(days=1), future[-1])  # Any gap before the cutoff, then the horizon
+    ahead_weekend = (ahead.dayofweek >= 5).astype(float)[:, None]
+
+    results, fit_seconds = {}, 0.0
+    for item, series in zip(items, matrix):
+        first = int((series > 0).argmax())
+        started = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # statsmodels re-enables its own warnings on import
+            results[item] = ARIMA(series[first:], exog=weekend[first:], order=(2, 0, 1)).fit()
+        fit_seconds += time.perf_counter() - started
+
+    started = time.perf_counter()
+    predictions = {
+        item: np.rint(result.forecast(len(ahead), exog=ahead_weekend))[-len(future):]
+        for item, result in results.items()
+    }
+    return predictions, fit_seconds, time.perf_counter() - started
+
+
+def run_xgboost(train, future):
+    started = time.perf_counter()
+    state = xgb_forecast.fit(train, int((future[-1] - train["Date"].max()).days))
+    fit_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predictions = xgb_forecast.predict(state, future)
+    return dict(zip(state["items"], predictions)), fit_seconds, time.perf_counter() - started
+
+
+def run_fast(train, future):
+    items, dates, matrix = rollups.sales_matrix(train, end=future[0] - pd.Timedelta(days=1))  # Through the day before the cutoff, like fast_forecast.history
+    started = time.perf_counter()
+    state = fast_forecast.fit(matrix, dates)
+    fit_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predictions = fast_forecast.predict(state, future)
+    return dict(zip(items, predictions)), fit_seconds, time.perf_counter() - started
+
+
+RUNNERS = {"prophet": run_prophet, "arima": run_arima, "xgboost": run_xgboost, "fast": run_fast}
+
+
+def memory_mb():
+    """(current, peak) RSS of this process in MB.
+
+    Linux reads VmRSS/VmHWM, whose peak `reset_peak_memory` can clear.
+    Elsewhere both are ru_maxrss (KB on BSD, bytes on macOS).
+    """
+    try:
+        with open("/proc/self/status") as handle:
+            status = dict(line.split(":", 1) for line in handle if ":" in line)
+        return int(status["VmRSS"].split()[0]) / 2 ** 10, int(status["VmHWM"].split()[0]) / 2 ** 10
+    except (OSError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+        return peak, peak
+
+
+def reset_peak_memory():
+    """Start the peak over from the current RSS (Linux only; elsewhere the peak keeps counting)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as handle:
+            handle.write("5")
+    except OSError:
+        pass
+
+
+def mape(predictions, actual, items, future):
+    """Mean absolute percentage error over item-days with non-zero actual sales."""
+    truth = actual.reindex(index=items, columns=future, fill_value=0).to_numpy(dtype=float)
+    predicted = np.vstack([np.asarray(predictions[item], dtype=float) for item in items])
+    sold = truth > 0
+    return float(np.mean(np.abs(predicted[sold] - truth[sold]) / truth[sold])) if sold.any() else None
+
+
+def backtest(engine, sales, cutoff, horizon, threads):
+    """Train `engine` on sales before `cutoff` and score the next `horizon` days."""
+    logging.getLogger("cmdstanpy").setLevel(logging.ERROR)
+    logging.getLogger("prophet").setLevel(logging.ERROR)
+    warnings.filterwarnings("ignore")
+    xgb_forecast.XGB_PARAMS["n_jobs"] = threads
+
+    train = sales[sales["Date"] < cutoff]
+    items = eligible(train)
+    train = train[train["Item_Name"].isin(items)]
+    future = pd.date_range(start=cutoff, periods=horizon)
+    actual = sales[sales["Date"].isin(future)].pivot_table(
+        index="Item_Name", columns="Date", values="Quantity_Sold", aggfunc="sum", fill_value=0,
+    )
+
+    reset_peak_memory()
+    baseline, _ = memory_mb()  # Interpreter, libraries and this fold's data
+    predictions, fit_seconds, predict_seconds = RUNNERS[engine](train, future)
+    _, peak = memory_mb()
+
+    return {
+        "engine": engine,
+        "cutoff": cutoff.date().isoformat(),
+        "items": len(items),
+        "fit_seconds": round(fit_seconds, 4),
+        "predict_seconds": round(predict_seconds, 4),
+        "peak_rss_mb": round(peak, 1),
+        "engine_rss_mb": round(peak - baseline, 1),
+        "mape": mape(predictions, actual, items, future),
+    }
+
+
+def summarize(folds):
+    """Per-engine means over folds (MAPE ignores folds without any sales)."""
+    summary = {}
+    for engine in dict.fromkeys(fold["engine"] for fold in folds):
+        runs = [fold for fold in folds if fold["engine"] == engine]
+        scores = [run["mape"] for run in runs if run["mape"] is not None]
+        summary[engine] = {
+            "fit_seconds": round(float(np.mean([run["fit_seconds"] for run in runs])), 4),
+            "predict_seconds": round(float(np.mean([run["predict_seconds"] for run in runs])), 4),
+            "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+            "engine_rss_mb": max(run["engine_rss_mb"] for run in runs),
+            "mape": round(float(np.mean(scores)), 4) if scores else None,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--lines", type=int, default=3, help="Order lines per item per day")
+    parser.add_argument("--weekly", type=float, default=0.5, help="Weekend demand lift")
+    parser.add_argument("--yearly", type=float, default=0.2, help="Yearly seasonality amplitude")
+    parser.add_argument("--horizon", type=int, default=14, help="Days forecast per fold")
+    parser.add_argument("--folds", type=int, default=3, help="Rolling origins, --horizon days apart")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="forecast_report.json")
+    args = parser.parse_args()
+
+    engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+    unknown = set(engines) - set(RUNNERS)
+    if unknown:
+        parser.error(f"unknown engine(s): {', '.join(sorted(unknown))}")
+
+    started = time.perf_counter()
+    activity = synthetic_activity(args.items, args.days, args.lines, args.weekly, args.yearly, args.seed)
+    sales = fold_rollups(activity)
+    generate_seconds = time.perf_counter() - started
+
+    last = sales["Date"].max()
+    cutoffs = [last - pd.Timedelta(days=args.horizon * fold - 1) for fold in range(args.folds, 0, -1)]
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    tasks = [(engine, cutoff) for engine in engines for cutoff in cutoffs]
+
+    # ✅ One task per worker process, so no fold's peak RSS includes another fold's allocations
+    with ProcessPoolExecutor(max_workers=args.workers, max_tasks_per_child=1) as pool:
+        futures = [pool.submit(backtest, engine, sales, cutoff, args.horizon, threads) for engine, cutoff in tasks]
+        folds = [future.result() for future in futures]
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args) | {"engines": engines},
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "data": {
+            "activity_rows": len(activity),
+            "rollup_rows": len(sales),
+            "generate_seconds": round(generate_seconds, 3),
+        },
+        "summary": summarize(folds),
+        "folds": folds,
+        "total_seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(args.out, "w") as handle:
+        json.dump(report, handle, indent=2)
+
+    print(f"{'Engine':<10} {'Fit s':>9} {'Predict s':>10} {'Peak RSS MB':>12} {'Engine MB':>10} {'MAPE':>7}")
+    for engine, row in report["summary"].items():
+        score = f"{row['mape']:.3f}" if row["mape"] is not None else "n/a"
+        print(f"{engine:<10} {row['fit_seconds']:>9.3f} {row['predict_seconds']:>10.4f} {row['peak_rss_mb']:>12.1f} {row['engine_rss_mb']:>10.1f} {score:>7}")
+    print(f"✅ Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark GET /menu/ and /menu/capacity query count and latency as the number of recipes grows.
+
+Runs against a throwaway in-memory SQLite database, so no server is needed:
+
+    python bench_menu.py
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import ingredients
+import menu_engine
+import models
+
+INGREDIENTS_PER_RECIPE = 8
+INGREDIENT_POOL = 400
+LOTS_PER_INGREDIENT = 3
+RECIPE_COUNTS = [10, 50, 100, 300, 1000, 3000]
+
+
+def seed(db, n_recipes):
+    rng = random.Random(42)
+    now = datetime.now()
+    names = [f"Ingredient {i}" for i in range(INGREDIENT_POOL)]
+
+    for name in names:
+        # ✅ Distinct expiries: (Item_Name, Expiry_Date) is unique
+        for days in rng.sample(range(1, 31), LOTS_PER_INGREDIENT):
+            db.add(models.InventoryItem(
+                Item_Name=name,
+                Category="Bench",
+                Quantity=rng.uniform(50, 500),
+                Unit="g",
+                Price_per_Unit=rng.uniform(0.01, 0.5),
+                Expiry_Date=now + timedelta(days=days),
+                Storage_Location="Walk-in",
+                Detected_By_AI=False,
+                Confidence_Score=1.0,
+            ))
+
+    for i in range(n_recipes):
+        amounts = {name: f"{rng.randint(10, 200)}g" for name in rng.sample(names, INGREDIENTS_PER_RECIPE)}
+        db.add(models.Recipe(
+            Dish_Name=f"Dish {i}",
+            Ingredients=amounts,
+            Calories=500.0,
+            Prep_Time=10,
+            Cooking_Time=15,
+            price=10.0,
+        ))
+    db.flush()
+    ingredients.compile_missing(db)
+    db.commit()
+
+
+def run(n_recipes):
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    with Session() as db:
+        seed(db, n_recipes)
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(1))
+
+    with Session() as db:
+        started = time.perf_counter()
+        menu = menu_engine.build_menu(db)
+        elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        menu_engine.build_capacity(db)
+        capacity_elapsed = time.perf_counter() - started
+
+    engine.dispose()
+    return len(queries) // 2, elapsed, capacity_elapsed, len(menu)
+
+
+if __name__ == "__main__":
+    print(f"{'recipes':>8} | {'queries':>7} | {'menu ms':>8} | {'cap. ms':>8} | {'on menu':>7}")
+    print("-" * 51)
+    counts = set()
+    for n in RECIPE_COUNTS:
+        query_count, elapsed, capacity_elapsed, menu_size = run(n)
+        counts.add(query_count)
+        print(f"{n:>8} | {query_count:>7} | {elapsed * 1000:>8.1f} | {capacity_elapsed * 1000:>8.1f} | {menu_size:>7}")
+
+    if len(counts) != 1:
+        raise SystemExit("❌ Query count grew with the number of recipes")
+    print(f"\n✅ Query count is constant ({counts.pop()}) across recipe counts")
@@ -0,0 +1,99 @@
+"""Benchmark how long `import main` takes and how much memory it leaves resident.
+
+Each run imports main in a fresh interpreter and records the wall time, the
+peak RSS, and any heavy analytics modules that got loaded. It then imports
+each engine the way its endpoint first would, to show what that first use
+costs. No server or database is needed:
+
+    python bench_startup.py [--runs 5] [--max-seconds 1.5] [--max-rss-mb 200]
+
+The exit status is non-zero when a heavy module is loaded by `import main`, or
+when the median import time or RSS goes over its budget, so CI can keep the
+gains from regressing.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["prophet", "statsmodels", "xgboost", "sklearn", "pandas", "google.generativeai", "matplotlib", "cv2"]
+ENGINES = {
+    "fast_forecast": "import fast_forecast",
+    "purchasing": "import purchasing",
+    "history_import": "import history_import",
+    "xgb_forecast": "import xgb_forecast",
+    "forecasting (Prophet)": "import forecasting",
+    "gemini SDK": "import gemini; gemini.sdk()",
+}
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - started
+status = dict(line.split(":", 1) for line in open("/proc/self/status") if ":" in line)
+rss_kb = int(status["VmHWM"].split()[0]) if "VmHWM" in status else None
+print(json.dumps({{"seconds": seconds, "rss_mb": rss_kb / 1024 if rss_kb else None,
+                  "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(statement, setup=""):
+    """Run `setup` then time `statement` in a fresh interpreter next to main.py."""
+    code = setup + "\n" + CHILD.format(statement=statement, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None, help="budget for the median import time")
+    parser.add_argument("--max-rss-mb", type=float, default=None, help="budget for the median peak RSS")
+    parser.add_argument("--skip-engines", action="store_true", help="only measure `import main`")
+    args = parser.parse_args()
+
+    runs = [measure("import main") for _ in range(args.runs)]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    rss_values = [run["rss_mb"] for run in runs if run["rss_mb"] is not None]
+    rss = statistics.median(rss_values) if rss_values else None
+    heavy = sorted({name for run in runs for name in run["heavy"]})
+
+    print(f"import main: {seconds * 1000:.0f} ms median over {args.runs} run(s)"
+          + (f", peak RSS {rss:.0f} MB" if rss is not None else ""))
+    print(f"heavy modules loaded: {', '.join(heavy) or 'none'}")
+
+    if not args.skip_engines:
+        print(f"\n{'first use of':<24} | {'+ms':>7} | {'+RSS MB':>7}")
+        print("-" * 44)
+        for name, statement in ENGINES.items():
+            try:
+                engine = measure(statement, setup="import main")
+            except subprocess.CalledProcessError as e:
+                print(f"{name:<24} | failed: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+                continue
+            extra_rss = engine["rss_mb"] - rss if engine["rss_mb"] is not None and rss is not None else float("nan")
+            print(f"{name:<24} | {engine['seconds'] * 1000:>7.0f} | {extra_rss:>7.0f}")
+
+    failures = []
+    if heavy:
+        failures.append(f"`import main` loaded {', '.join(heavy)}")
+    if args.max_seconds is not None and seconds > args.max_seconds:
+        failures.append(f"import took {seconds:.2f}s (budget {args.max_seconds}s)")
+    if args.max_rss_mb is not None and rss is not None and rss > args.max_rss_mb:
+        failures.append(f"peak RSS {rss:.0f} MB (budget {args.max_rss_mb} MB)")
+    if failures:
+        raise SystemExit("❌ " + "; ".join(failures))
+    print("\n✅ Startup is within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Per-table versions for ETag/304 reads and the in-process /menu/ cache.
+
+A table's version is the newest change-feed version written for it (see
+changes.py), so it is strong and comparable across workers. Commits in this
+process bump the counters directly; changes committed by other workers are
+picked up by re-reading the per-table maximums at most every
+TABLE_VERSION_TTL seconds. Between refreshes a read's ETag and 304 check
+cost no database round trip.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import func
+
+import models
+from database import SessionLocal
+
+TABLE_VERSION_TTL = float(os.getenv("TABLE_VERSION_TTL", "1"))
+MENU_CACHE_SECONDS = int(os.getenv("MENU_CACHE_SECONDS", "60"))  # Prices depend on days until expiry
+MENU_CACHE_SIZE = 8
+
+_versions = {}
+_synced_at = float("-inf")
+_lock = threading.Lock()
+_menu_cache = OrderedDict()
+
+
+def bump(versions):
+    """Raise local counters to `versions` ({table: version}) after a commit in this process."""
+    with _lock:
+        for table, version in versions.items():
+            if version > _versions.get(table, 0):
+                _versions[table] = version
+
+
+def refresh(db=None):
+    """Re-read every table's newest version from the change feed (on `db`, or a new session)."""
+    global _synced_at
+    if db is None:
+        with SessionLocal() as db:
+            return refresh(db)
+    rows = (
+        db.query(models.ChangeLog.Table_Name, func.max(models.ChangeLog.Version))
+        .group_by(models.ChangeLog.Table_Name)
+        .all()
+    )
+    bump(dict(rows))
+    _synced_at = time.monotonic()
+
+
+def stale():
+    return time.monotonic() - _synced_at > TABLE_VERSION_TTL
+
+
+async def refresh_async(db):
+    """Refresh through an AsyncSession if due, so `table_version` won't block the event loop."""
+    if stale():
+        await db.run_sync(refresh)
+
+
+def table_version(table):
+    """Current version of `table` (0 before its first change)."""
+    if stale():
+        refresh()
+    return _versions.get(table, 0)
+
+
+def tag(*parts):
+    """Strong ETag over everything a representation depends on."""
+    return '"' + hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20] + '"'
+
+
+def etag(tables, *variant):
+    """Strong ETag for a representation built from `tables` (plus e.g. its query string)."""
+    return tag(*(f"{table}={table_version(table)}" for table in tables), *variant)
+
+
+def not_modified(if_none_match, current):
+    """Whether an If-None-Match header matches `current`."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or current in candidates
+
+
+def menu_key():
+    """Cache key for the computed menu: the versions it depends on and the pricing time bucket."""
+    return (
+        table_version(models.InventoryItem.__tablename__),
+        table_version(models.Recipe.__tablename__),
+        int(time.time() // MENU_CACHE_SECONDS),
+    )
+
+
+def menu_hit(key):
+    """The cached serialized menu for `key`, or None."""
+    with _lock:
+        body = _menu_cache.get(key)
+        if body is not None:
+            _menu_cache.move_to_end(key)
+        return body
+
+
+def remember_menu(key, body):
+    """Cache a serialized menu; keeps the last MENU_CACHE_SIZE entries."""
+    with _lock:
+        _menu_cache[key] = body
+        while len(_menu_cache) > MENU_CACHE_SIZE:
+            _menu_cache.popitem(last=False)
+
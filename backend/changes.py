@@ -0,0 +1,261 @@
+"""Change feed: compact row diffs with a monotonically increasing version.
+
+Writers add a change_log row in the same transaction as the mutation, so a
+change is published exactly when (and only if) it commits. Readers ask for
+everything after the last version they saw (GET /changes/?since=N) or keep a
+Server-Sent Events stream open (GET /changes/stream) that resumes from
+Last-Event-ID after a reconnect. Commits in this process wake open streams
+immediately; writes from other workers are picked up every FEED_POLL_SECONDS.
+
+Drop old entries with:
+
+    python changes.py prune [days]
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import caching
+import models
+from database import SessionLocal
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+FEED_POLL_SECONDS = float(os.getenv("FEED_POLL_SECONDS", "2"))
+FEED_HEARTBEAT_SECONDS = 15.0
+FEED_GAP_SECONDS = 5.0  # How long a missing version may still be an uncommitted transaction
+FEED_RETENTION_DAYS = int(os.getenv("FEED_RETENTION_DAYS", "7"))
+FEED_PAGE_SIZE = 1000
+
+_subscribers = set()
+
+
+def jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def row(obj):
+    """Every column of a mapped object as a JSON-ready dict."""
+    return {column.key: jsonable(getattr(obj, column.key)) for column in inspect(obj).mapper.column_attrs}
+
+
+def _key(obj):
+    return inspect(obj).identity[0]
+
+
+def inserted(db, obj):
+    """Publish a new row (flushing first if its primary key isn't assigned yet)."""
+    if inspect(obj).identity is None:
+        db.flush()
+    _add(db, obj, INSERT, row(obj))
+
+
+def updated(db, obj, keys=None):
+    """Publish changed columns of `obj`: `keys`, or whatever changed since the last flush.
+
+    The version column (if any) is always included so clients can patch it too.
+    """
+    state = inspect(obj)
+    if keys is None:
+        keys = [attr.key for attr in state.attrs if attr.history.has_changes()]
+    if not keys:
+        return
+    if state.modified:
+        db.flush()  # ✅ Bumps the optimistic-lock version
+    keys = list(keys)
+    version_column = state.mapper.version_id_col
+    if version_column is not None:
+        keys.append(state.mapper.get_property_by_column(version_column).key)
+    _add(db, obj, UPDATE, {key: jsonable(getattr(obj, key)) for key in dict.fromkeys(keys)})
+
+
+def deleted(db, obj):
+    """Publish a deleted row by its key."""
+    _add(db, obj, DELETE, None)
+
+
+def _add(db, obj, operation, data):
+    record(db, obj.__tablename__, operation, _key(obj), data)
+
+
+def record(db, table_name, operation, key, data=None):
+    """Publish a change to a row written without the ORM (e.g. a bulk upsert)."""
+    db.add(models.ChangeLog(
+        Table_Name=table_name,
+        Operation=operation,
+        Row_Key=key,
+        Data=data,
+        Date_Time=datetime.now(),
+    ))
+    db.info["changes"] = True
+
+
+def latest(db):
+    """The newest committed version (0 when the feed is empty)."""
+    return db.query(func.max(models.ChangeLog.Version)).scalar() or 0
+
+
+def read(db, since, limit=FEED_PAGE_SIZE):
+    """Changes after version `since` as (events, reset).
+
+    Stops before a recent gap in versions, since a transaction that got the
+    missing version may still commit. `reset` is True when entries the client
+    needs were pruned and it has to refetch the tables.
+    """
+    if since > 0:
+        oldest = db.query(func.min(models.ChangeLog.Version)).scalar()
+        if oldest is not None and oldest > since + 1:
+            kept = db.query(models.ChangeLog.Version).filter(models.ChangeLog.Version <= since).first()
+            if kept is None:
+                return [], True
+
+    rows = (
+        db.query(models.ChangeLog)
+        .filter(models.ChangeLog.Version > since)
+        .order_by(models.ChangeLog.Version)
+        .limit(limit)
+        .all()
+    )
+    events = []
+    expected = since + 1
+    settled = datetime.now() - timedelta(seconds=FEED_GAP_SECONDS)
+    for change in rows:
+        if change.Version != expected and change.Date_Time > settled:
+            break
+        events.append({
+            "version": change.Version,
+            "table": change.Table_Name,
+            "op": change.Operation,
+            "key": change.Row_Key,
+            "data": change.Data,
+            "at": jsonable(change.Date_Time),
+        })
+        expected = change.Version + 1
+    return events, False
+
+
+def prune(db, before):
+    """Delete entries older than `before`; returns how many were removed.
+
+    The newest entry of each table is always kept, so `read` can tell pruned
+    history from an empty feed and table versions (see caching.py) never go back.
+    """
+    newest = db.query(func.max(models.ChangeLog.Version)).group_by(models.ChangeLog.Table_Name)
+    return (
+        db.query(models.ChangeLog)
+        .filter(models.ChangeLog.Date_Time < before, models.ChangeLog.Version.notin_(newest.scalar_subquery()))
+        .delete(synchronize_session=False)
+    )
+
+
+def subscribe():
+    """Register an asyncio.Event that is set whenever this process commits a change."""
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    _subscribers.add(waiter)
+    return waiter
+
+
+def unsubscribe(waiter):
+    _subscribers.discard(waiter)
+
+
+def notify():
+    for loop, waiter in list(_subscribers):
+        loop.call_soon_threadsafe(waiter.set)
+
+
+def _read_page(since):
+    with SessionLocal() as db:
+        return read(db, since)
+
+
+def current_version():
+    """`latest` in a session of its own, for callers on the event loop (via run_in_threadpool)."""
+    with SessionLocal() as db:
+        return latest(db)
+
+
+def _sse(event_name, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event_name}", f"data: {json.dumps(data, separators=(',', ':'))}"]
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(since, is_disconnected):
+    """Server-Sent Events for every change after `since`, until the client goes away.
+
+    Each event's id is its version; after a reconnect the browser sends it back
+    as Last-Event-ID. A `reset` event means the client must refetch its tables.
+    """
+    waiter = subscribe()
+    idle = 0.0
+    try:
+        while not await is_disconnected():
+            waiter[1].clear()  # ✅ Before reading, so a commit during the read isn't missed
+            events, reset = await run_in_threadpool(_read_page, since)
+            if reset:
+                since = await run_in_threadpool(current_version)
+                yield _sse("reset", {"version": since}, since)
+            for change in events:
+                since = change["version"]
+                yield _sse("change", change, since)
+            if events or reset:
+                idle = 0.0
+                if len(events) == FEED_PAGE_SIZE:
+                    continue  # More backlog to catch up on
+
+            try:
+                await asyncio.wait_for(waiter[1].wait(), FEED_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                idle += FEED_POLL_SECONDS
+                if idle >= FEED_HEARTBEAT_SECONDS:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+    finally:
+        unsubscribe(waiter)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, _flush_context):
+    if not session.info.get("changes"):
+        return
+    versions = session.info.setdefault("change_versions", {})
+    for obj in session.new:
+        if isinstance(obj, models.ChangeLog):
+            versions[obj.Table_Name] = max(obj.Version, versions.get(obj.Table_Name, 0))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    versions = session.info.pop("change_versions", None)
+    if versions:
+        caching.bump(versions)  # ✅ ETags move on as soon as this process commits
+    if session.info.pop("changes", False):
+        notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("changes", None)
+    session.info.pop("change_versions", None)
+
+
+if __name__ == "__main__":
+    if not sys.argv[1:] or sys.argv[1] != "prune":
+        raise SystemExit("Usage: python changes.py prune [days]")
+
+    days = int(sys.argv[2]) if sys.argv[2:] else FEED_RETENTION_DAYS
+    with SessionLocal() as db:
+        removed = prune(db, datetime.now() - timedelta(days=days))
+        db.commit()
+    print(f"✅ Pruned {removed} change(s) older than {days} day(s)")
@@ -0,0 +1,238 @@
+"""Persisted forecasts with a background scheduler that refits only changed items.
+
+An item is refitted when its DailyActivity high-water mark (latest Date_Time,
+plus row count to catch back-dated rows) moved since its last fit, or when its
+stored horizon has run down below FORECAST_MIN_COVERAGE_DAYS. Run the scheduler
+in one process only (FORECAST_SCHEDULER=0 on the other workers).
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func, insert
+
+import models
+import rollups
+from database import SessionLocal
+
+FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "30"))
+FORECAST_MIN_COVERAGE_DAYS = int(os.getenv("FORECAST_MIN_COVERAGE_DAYS", "14"))
+FORECAST_REFIT_INTERVAL = float(os.getenv("FORECAST_REFIT_INTERVAL", "900"))  # Seconds
+FORECAST_SCHEDULER = os.getenv("FORECAST_SCHEDULER", "1") == "1"
+FORECAST_JOB_TIMEOUT = timedelta(hours=1)  # Older queued/running jobs are treated as abandoned
+
+logger = logging.getLogger(__name__)
+_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="forecast-refit")
+_stop = threading.Event()
+_scheduler = None
+
+
+def activity_marks(db):
+    """{item: (latest Date_Time, row count)} computed in SQL."""
+    return {
+        name: (high_water_mark, row_count)
+        for name, high_water_mark, row_count in db.query(
+            models.DailyActivity.Item_Name,
+            func.max(models.DailyActivity.Date_Time),
+            func.count(),  # ✅ Not a column, so (Item_Name, Date_Time) covers the query (index-only scan)
+        ).group_by(models.DailyActivity.Item_Name)
+    }
+
+
+def stale_items(db, today, force=False):
+    """Items whose data changed since their last fit or whose forecast is running out."""
+    marks = activity_marks(db)
+    if force:
+        return sorted(marks), marks
+
+    fits = {fit.Item_Name: fit for fit in db.query(models.ForecastFit)}
+    horizon_end = dict(
+        db.query(models.Forecast.Item_Name, func.max(models.Forecast.Date)).group_by(models.Forecast.Item_Name)
+    )
+
+    stale = []
+    for item, (high_water_mark, row_count) in marks.items():
+        fit = fits.get(item)
+        if fit is None or fit.High_Water_Mark != high_water_mark or fit.Row_Count != row_count:
+            stale.append(item)
+        elif fit.Status == "ok":
+            end = horizon_end.get(item)
+            if end is None or (end.date() - today).days + 1 < FORECAST_MIN_COVERAGE_DAYS:
+                stale.append(item)
+        elif fit.Status == "failed" and fit.Fitted_At.date() < today:
+            stale.append(item)  # ✅ Retry failed items once a day
+    return sorted(stale), marks
+
+
+def refit(db, items, marks, today):
+    """Refit `items` and replace their stored forecasts; returns (refitted, failed)."""
+    import forecasting  # ✅ Prophet is only loaded by the process that actually refits
+
+    sales = rollups.sales_frame(db, items)
+    predictions, failures = forecasting.forecast_items(sales, FORECAST_HORIZON_DAYS, today)
+    fitted_at = datetime.now()
+    fitted = {frame['Item_Name'].iat[0]: frame for frame in predictions}
+
+    # ✅ Failed items keep their previous forecast
+    replaced = [item for item in items if item not in failures]
+    if replaced:
+        db.query(models.Forecast).filter(models.Forecast.Item_Name.in_(replaced)).delete(synchronize_session=False)
+    rows = [
+        {
+            "Item_Name": item,
+            "Date": ds.to_pydatetime(),
+            "Predicted_Quantity": int(yhat),
+            "Fitted_At": fitted_at,
+        }
+        for item, frame in fitted.items()
+        for ds, yhat in zip(frame['ds'], frame['yhat'])
+    ]
+    if rows:
+        db.execute(insert(models.Forecast), rows)
+
+    for item in items:
+        high_water_mark, row_count = marks[item]
+        db.merge(models.ForecastFit(
+            Item_Name=item,
+            High_Water_Mark=high_water_mark,
+            Row_Count=row_count,
+            Fitted_At=fitted_at,
+            Status="ok" if item in fitted else "failed" if item in failures else "skipped",
+            Error=failures.get(item),
+        ))
+    db.commit()
+    return len(fitted), len(failures)
+
+
+def read(db, n_days, today):
+    """Stored predictions for the next `n_days`, or None if the store can't cover them.
+
+    Returns (records, fitted_at) where fitted_at is the oldest fit that was served.
+    """
+    fits = {
+        name: fitted_at
+        for name, fitted_at in db.query(models.ForecastFit.Item_Name, models.ForecastFit.Fitted_At)
+        .filter(models.ForecastFit.Status == "ok")
+    }
+    if not fits:
+        return None
+
+    start = datetime.combine(today, time.min)
+    rows = (
+        db.query(models.Forecast.Date, models.Forecast.Predicted_Quantity, models.Forecast.Item_Name)
+        .filter(models.Forecast.Date >= start)
+        .order_by(models.Forecast.Item_Name, models.Forecast.Date)
+        .all()
+    )
+
+    records = []
+    served = {}
+    for date, predicted_quantity, item in rows:
+        if item not in fits or served.get(item, 0) >= n_days:
+            continue
+        served[item] = served.get(item, 0) + 1
+        records.append({"Date": date, "Predicted_Quantity": predicted_quantity, "Item_Name": item})
+
+    if any(served.get(item, 0) < n_days for item in fits):
+        return None
+    return records, min(fits.values())
+
+
+def status(db):
+    """Per-item fit status plus how fresh the store is."""
+    now = datetime.now()
+    fits = db.query(models.ForecastFit).order_by(models.ForecastFit.Item_Name).all()
+    return {
+        "horizon_days": FORECAST_HORIZON_DAYS,
+        "items": [
+            {
+                "Item_Name": fit.Item_Name,
+                "Status": fit.Status,
+                "High_Water_Mark": fit.High_Water_Mark,
+                "Fitted_At": fit.Fitted_At,
+                "Age_Seconds": int((now - fit.Fitted_At).total_seconds()),
+                "Error": fit.Error,
+            }
+            for fit in fits
+        ],
+    }
+
+
+def run_job(job_id):
+    """Claim a queued job and refit whatever is stale (or everything when forced)."""
+    with SessionLocal() as db:
+        claimed = (
+            db.query(models.ForecastJob)
+            .filter(models.ForecastJob.Job_ID == job_id, models.ForecastJob.Status == "queued")
+            .update({"Status": "running", "Started_At": datetime.now()}, synchronize_session=False)
+        )
+        db.commit()
+        if not claimed:
+            return
+
+        job = db.get(models.ForecastJob, job_id)
+        try:
+            today = datetime.now().date()
+            items, marks = stale_items(db, today, job.Force)
+            refitted, failed = refit(db, items, marks, today) if items else (0, 0)
+            job = db.get(models.ForecastJob, job_id)
+            job.Status = "done"
+            job.Items_Refitted = refitted
+            job.Items_Failed = failed
+        except Exception as e:
+            logger.exception("Forecast job %s failed", job_id)
+            db.rollback()
+            job = db.get(models.ForecastJob, job_id)
+            job.Status = "failed"
+            job.Error = repr(e)
+        job.Finished_At = datetime.now()
+        db.commit()
+
+
+def enqueue(force=False):
+    """Queue a refit job on the background runner and return its ID."""
+    job_id = uuid.uuid4().hex
+    with SessionLocal() as db:
+        db.add(models.ForecastJob(Job_ID=job_id, Status="queued", Force=force, Requested_At=datetime.now()))
+        db.commit()
+    _runner.submit(run_job, job_id)
+    return job_id
+
+
+def _schedule_loop():
+    while True:
+        try:
+            with SessionLocal() as db:
+                busy = (
+                    db.query(models.ForecastJob)
+                    .filter(
+                        models.ForecastJob.Status.in_(["queued", "running"]),
+                        models.ForecastJob.Requested_At > datetime.now() - FORECAST_JOB_TIMEOUT,
+                    )
+                    .count()
+                )
+            if not busy:
+                enqueue()
+        except Exception:
+            logger.exception("Forecast scheduler tick failed")
+        if _stop.wait(FORECAST_REFIT_INTERVAL):
+            break
+
+
+def start_scheduler():
+    """Start the periodic refit thread (no-op when disabled or already running)."""
+    global _scheduler
+    if not FORECAST_SCHEDULER or FORECAST_REFIT_INTERVAL <= 0 or _scheduler is not None:
+        return
+    _stop.clear()
+    _scheduler = threading.Thread(target=_schedule_loop, name="forecast-scheduler", daemon=True)
+    _scheduler.start()
+
+
+def stop_scheduler():
+    global _scheduler
+    _stop.set()
+    _scheduler = None
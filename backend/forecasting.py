@@ -0,0 +1,103 @@
+"""Per-item Prophet demand forecasting for GET /forecast/{n_days}.
+
+Each item's model is fitted in a shared process pool (FORECAST_WORKERS, default
+one per CPU). Results come back in item-name order and an item that fails to
+fit is logged and skipped instead of failing the whole request.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+from prophet import Prophet
+
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 1)))
+MIN_ROWS_PER_ITEM = 50  # DailyActivity rows, i.e. summed Order_Lines
+
+logger = logging.getLogger(__name__)
+_pool = None
+
+
+def get_pool():
+    """Process pool shared by all requests, created on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=FORECAST_WORKERS)
+    return _pool
+
+
+def reset_pool():
+    """Drop a broken pool so the next request starts a fresh one."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+
+def fit_prophet(item, daily_data, n_days, today):
+    """Fit one item's Prophet model and predict `n_days` from `today`."""
+    model = Prophet(daily_seasonality=True, weekly_seasonality=True)
+    model.add_regressor('weekend')
+    model.fit(daily_data)
+
+    future_dates = pd.date_range(start=today, periods=n_days)
+    future = pd.DataFrame({'ds': future_dates})
+    future['weekend'] = future['ds'].dt.dayofweek.apply(lambda x: 1 if x >= 5 else 0)
+
+    forecast = model.predict(future)
+
+    item_forecast = forecast[['ds', 'yhat']].copy()
+    item_forecast['Item_Name'] = item
+    item_forecast['yhat'] = item_forecast['yhat'].round().astype(int)
+    return item_forecast
+
+
+def daily_series(item_sales):
+    """Turn one item's daily_sales rollups into Prophet's (ds, y, weekend) frame."""
+    daily_data = pd.DataFrame({
+        'ds': item_sales['Date'].to_numpy(),
+        'y': item_sales['Quantity_Sold'].to_numpy(),
+        'Revenue': (item_sales['Revenue'] / item_sales['Order_Lines']).to_numpy(),
+    })
+    daily_data['weekend'] = (daily_data['ds'].dt.dayofweek >= 5).astype(int)
+    return daily_data
+
+
+def forecast_items(sales, n_days, today, workers=None):
+    """Fit every item with enough history (from a `rollups.sales_frame`) in parallel.
+
+    Returns (predictions, failures): a list of per-item forecast frames in
+    item-name order and {item: error message}.
+    """
+    workers = FORECAST_WORKERS if workers is None else workers
+    jobs = []
+    for item, item_sales in sales.groupby('Item_Name', sort=True):
+        if item_sales['Order_Lines'].sum() < MIN_ROWS_PER_ITEM:
+            continue
+        jobs.append((item, daily_series(item_sales)))
+
+    predictions = []
+    failures = {}
+
+    if workers <= 1 or len(jobs) <= 1:
+        for item, daily_data in jobs:
+            try:
+                predictions.append(fit_prophet(item, daily_data, n_days, today))
+            except Exception as e:
+                failures[item] = repr(e)
+    else:
+        pool = get_pool()
+        futures = [(item, pool.submit(fit_prophet, item, daily_data, n_days, today)) for item, daily_data in jobs]
+        for item, future in futures:
+            try:
+                predictions.append(future.result())
+            except BrokenProcessPool as e:
+                failures[item] = repr(e)
+                reset_pool()
+            except Exception as e:
+                failures[item] = repr(e)
+
+    for item, error in failures.items():
+        logger.warning("Forecast for %r failed: %s", item, error)
+    return predictions, failures
@@ -0,0 +1,153 @@
+"""Non-blocking Gemini calls behind one process-wide concurrency limiter.
+
+Every call goes through `generate`, which awaits the async client, so the
+event loop keeps serving other requests during the round trip. At most
+GEMINI_CONCURRENCY calls are in flight. Up to GEMINI_QUEUE_LIMIT more wait
+for a slot, and callers beyond that get GeminiBusy straight away instead of
+piling up. Each attempt is cut off after GEMINI_TIMEOUT_SECONDS. Timeouts,
+rate limits and 5xx errors are retried with full-jitter exponential backoff,
+and the slot is given back while a call waits to retry. `metrics()` reports
+the queue depth, in-flight calls and outcome counters (GET /gemini/status).
+
+The SDK itself is imported and configured on the first call, so workers that
+never talk to Gemini don't pay for it.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "gemini-key")  # Replace with a secure method
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+GEMINI_QUEUE_LIMIT = int(os.getenv("GEMINI_QUEUE_LIMIT", "32"))  # Waiting callers before new ones are turned away
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", "2"))  # Extra attempts after the first
+GEMINI_BACKOFF_SECONDS = 0.5  # Base of the jittered exponential backoff
+
+logger = logging.getLogger(__name__)
+_genai = None
+_retryable = (asyncio.TimeoutError,)
+_slots = None  # (event loop, asyncio.Semaphore)
+_stats = {
+    "waiting": 0,
+    "in_flight": 0,
+    "max_waiting": 0,
+    "calls": 0,
+    "attempts": 0,
+    "succeeded": 0,
+    "failed": 0,
+    "rejected": 0,
+    "retries": 0,
+    "timeouts": 0,
+    "wait_seconds": 0.0,
+    "call_seconds": 0.0,
+}
+
+
+class GeminiError(Exception):
+    """Gemini didn't answer (after retries) or the call failed for good."""
+
+
+class GeminiBusy(GeminiError):
+    """Too many calls are already waiting for a slot; try again later."""
+
+
+def sdk():
+    """The configured google.generativeai module (imported on first use)."""
+    global _genai, _retryable
+    if _genai is None:
+        import google.generativeai as genai
+        from google.api_core import exceptions as google_exceptions
+
+        genai.configure(api_key=GEMINI_API_KEY)
+        _retryable = (
+            asyncio.TimeoutError,
+            google_exceptions.ResourceExhausted,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.InternalServerError,
+            google_exceptions.DeadlineExceeded,
+        )
+        _genai = genai
+    return _genai
+
+
+def _semaphore():
+    global _slots
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots[0] is not loop:
+        _slots = (loop, asyncio.Semaphore(GEMINI_CONCURRENCY))
+    return _slots[1]
+
+
+def backoff(attempt):
+    """Full-jitter delay before retry number `attempt` (1-based)."""
+    return random.uniform(0, GEMINI_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+
+async def _attempt(model, contents):
+    slots = _semaphore()
+    if _stats["waiting"] >= GEMINI_QUEUE_LIMIT and slots.locked():
+        _stats["rejected"] += 1
+        raise GeminiBusy(f"{_stats['waiting']} Gemini call(s) already queued")
+
+    queued = time.perf_counter()
+    _stats["waiting"] += 1
+    _stats["max_waiting"] = max(_stats["max_waiting"], _stats["waiting"])
+    try:
+        await slots.acquire()
+    finally:
+        _stats["waiting"] -= 1
+    started = time.perf_counter()
+    _stats["wait_seconds"] += started - queued
+    _stats["in_flight"] += 1
+    _stats["attempts"] += 1
+    try:
+        return await asyncio.wait_for(
+            model.generate_content_async(contents, request_options={"timeout": GEMINI_TIMEOUT_SECONDS}),
+            GEMINI_TIMEOUT_SECONDS,
+        )
+    finally:
+        _stats["in_flight"] -= 1
+        _stats["call_seconds"] += time.perf_counter() - started
+        slots.release()
+
+
+async def generate(contents, model_name=GEMINI_MODEL):
+    """Await a Gemini response for `contents` (prompt text, images, ...) with limits, timeout and retries."""
+    model = sdk().GenerativeModel(model_name)
+    _stats["calls"] += 1
+    for attempt in range(GEMINI_RETRIES + 1):
+        try:
+            response = await _attempt(model, contents)
+        except GeminiBusy:
+            raise
+        except _retryable as e:
+            if isinstance(e, asyncio.TimeoutError):
+                _stats["timeouts"] += 1
+            if attempt == GEMINI_RETRIES:
+                _stats["failed"] += 1
+                raise GeminiError(f"Gemini didn't answer after {attempt + 1} attempt(s): {e.__class__.__name__}") from e
+            _stats["retries"] += 1
+            delay = backoff(attempt + 1)
+            logger.warning("Gemini call failed (%s), retrying in %.2fs", e.__class__.__name__, delay)
+            await asyncio.sleep(delay)
+        except Exception as e:
+            _stats["failed"] += 1
+            raise GeminiError(str(e)) from e
+        else:
+            _stats["succeeded"] += 1
+            return response
+
+
+def metrics():
+    """Queue depth, in-flight calls and outcome counters since the process started."""
+    return dict(
+        _stats,
+        concurrency=GEMINI_CONCURRENCY,
+        queue_limit=GEMINI_QUEUE_LIMIT,
+        wait_seconds=round(_stats["wait_seconds"], 3),
+        call_seconds=round(_stats["call_seconds"], 3),
+        avg_call_seconds=round(_stats["call_seconds"] / _stats["attempts"], 3) if _stats["attempts"] else None,
+    )
@@ -0,0 +1,293 @@
+"""Streaming import of historical POS exports into daily_activity and customer_order.
+
+Large CSV or Parquet files are read IMPORT_CHUNK_SIZE rows at a time, so
+memory stays flat however many years they cover. Each chunk is validated
+with vectorized pandas checks and its valid rows are written with one
+batched INSERT. The chunk's daily_sales rollups and the import's progress
+(import_job.Rows_Done) are updated in the same transaction.
+
+An import is identified by its target table and a hash of the file's
+content. Running the same file again after a failure resumes after the last
+committed chunk, and running a finished import again is a no-op.
+
+Imported orders are history: they don't deduct stock, and they aren't
+published on the change feed. By default each order also adds one
+DailyActivity line per dish, the same way a live order does.
+
+    python history_import.py daily-activity sales.csv
+    python history_import.py customer-order orders.parquet [--no-activity] [--chunk-size N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+
+import inventory_bulk
+import models
+import rollups
+from database import SessionLocal
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "20000"))
+IMPORT_MAX_ERRORS = 100  # Rejected rows reported back in detail; the rest are only counted
+FORMATS = ("csv", "parquet")
+TABLES = {
+    "daily-activity": models.DailyActivity,
+    "customer-order": models.CustomerOrder,
+}
+
+
+def fingerprint(source):
+    """SHA-256 of a seekable file's content (the file is left at the start)."""
+    digest = hashlib.sha256()
+    source.seek(0)
+    for block in iter(lambda: source.read(2 ** 20), b""):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def _flag(errors, mask, message):
+    errors[mask] = errors[mask] + message + "; "
+
+
+def _text(frame, column, errors, required=True):
+    values = frame[column].astype(str).str.strip() if column in frame.columns else pd.Series("", index=frame.index)
+    missing = values.isin(["", "nan", "None"]) | (frame[column].isna() if column in frame.columns else True)
+    if required:
+        _flag(errors, missing, f"{column} is required")
+    return values.where(~missing, None)
+
+
+def _number(frame, column, errors, integer=False):
+    values = pd.to_numeric(frame[column], errors="coerce") if column in frame.columns else pd.Series(np.nan, index=frame.index)
+    _flag(errors, values.isna() | (values < 0), f"{column} must be a non-negative number")
+    if integer:
+        _flag(errors, values.notna() & (values != np.floor(values)), f"{column} must be a whole number")
+    return values
+
+
+def _timestamp(frame, column, errors):
+    """Parse ISO 8601 in one vectorized pass, falling back to per-value parsing for other layouts."""
+    raw = frame[column] if column in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+    values = pd.to_datetime(raw, errors="coerce", utc=True, format="ISO8601")
+    retry = values.isna() & raw.notna()
+    if retry.any():
+        values[retry] = pd.to_datetime(raw[retry], errors="coerce", utc=True, format="mixed")
+    # ✅ Offsets are normalized to naive UTC; naive timestamps are kept as given
+    values = values.dt.tz_convert(None)
+    _flag(errors, values.isna(), f"{column} must be a date")
+    return values
+
+
+def day_types(date_times):
+    """Vectorized orders.get_day_type."""
+    return pd.Series(np.where(date_times.dt.weekday >= 5, "Weekend", "Weekday"), index=date_times.index)
+
+
+def validate_activity(frame):
+    """(clean DailyActivity rows, {position: error}) for one chunk."""
+    errors = pd.Series("", index=frame.index, dtype=object)
+    clean = pd.DataFrame({
+        "Date_Time": _timestamp(frame, "Date_Time", errors),
+        "Item_Name": _text(frame, "Item_Name", errors),
+        "Quantity_Sold": _number(frame, "Quantity_Sold", errors, integer=True),
+        "Revenue": _number(frame, "Revenue", errors),
+        "Customer_Count": _number(frame, "Customer_Count", errors, integer=True),
+        "Weather_Condition": _text(frame, "Weather_Condition", errors, required=False),
+        "Day_Type": _text(frame, "Day_Type", errors, required=False),
+    })
+    clean["Day_Type"] = clean["Day_Type"].fillna(day_types(clean["Date_Time"]))  # Derived when the export lacks it
+    return _split(clean, errors)
+
+
+def _items(value):
+    """Items_Ordered as a {dish: quantity} dict, or None when it isn't one."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    if not isinstance(value, dict) or not value:
+        return None
+    if not all(isinstance(quantity, (int, float)) and not isinstance(quantity, bool) and quantity >= 0 for quantity in value.values()):
+        return None
+    return value
+
+
+def validate_order(frame):
+    """(clean CustomerOrder rows, {position: error}) for one chunk."""
+    errors = pd.Series("", index=frame.index, dtype=object)
+    raw_items = frame["Items_Ordered"] if "Items_Ordered" in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+    items = raw_items.map(_items)
+    _flag(errors, items.isna(), "Items_Ordered must be a JSON object of {dish: quantity}")
+    clean = pd.DataFrame({
+        "Customer_ID": _number(frame, "Customer_ID", errors, integer=True),
+        "Date_Time": _timestamp(frame, "Date_Time", errors),
+        "Items_Ordered": items,
+        "Total_Bill": _number(frame, "Total_Bill", errors),
+        "Order_Status": _text(frame, "Order_Status", errors),
+    })
+    return _split(clean, errors)
+
+
+def _split(clean, errors):
+    failed = errors != ""
+    positions = np.flatnonzero(failed.to_numpy())
+    return clean[~failed], {int(position): errors.iat[position].rstrip("; ") for position in positions}
+
+
+def order_activity(orders):
+    """DailyActivity lines for orders, one per dish, like orders.OrderBook.place writes them."""
+    lines = [
+        (date_time, dish_name, quantity, total_bill)
+        for date_time, items, total_bill in zip(orders["Date_Time"], orders["Items_Ordered"], orders["Total_Bill"])
+        for dish_name, quantity in items.items()
+    ]
+    activity = pd.DataFrame(lines, columns=["Date_Time", "Item_Name", "Quantity_Sold", "Revenue"])
+    activity["Date_Time"] = pd.to_datetime(activity["Date_Time"])
+    activity["Quantity_Sold"] = activity["Quantity_Sold"].astype(int)
+    activity["Customer_Count"] = 1
+    activity["Weather_Condition"] = None
+    activity["Day_Type"] = day_types(activity["Date_Time"])
+    return activity
+
+
+def _records(frame, integers=()):
+    """DataFrame rows as plain-Python dicts for a batched INSERT."""
+    frame = frame.astype({column: "int64" for column in integers})
+    records = frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+    for record in records:
+        record["Date_Time"] = record["Date_Time"].to_pydatetime()
+    return records
+
+
+def write_chunk(db, kind, clean, with_activity=True):
+    """Insert one chunk's valid rows and add them to the rollups (no commit)."""
+    if kind == "customer-order":
+        db.execute(insert(models.CustomerOrder), _records(clean, integers=["Customer_ID"]))
+        if not with_activity:
+            return
+        clean = order_activity(clean)
+    else:
+        db.execute(insert(models.DailyActivity), _records(clean, integers=["Quantity_Sold", "Customer_Count"]))
+    rollups.add_rows(db, rollups.aggregate_frame(clean))
+
+
+def _summary(job, seconds, rows, errors):
+    return {
+        "Import_ID": job.Import_ID,
+        "Table": job.Table_Name,
+        "Status": job.Status,
+        "Rows_Done": job.Rows_Done,
+        "Rows_Imported": job.Rows_Imported,
+        "Rows_Failed": job.Rows_Failed,
+        "Rows_This_Run": rows,
+        "Seconds": round(seconds, 3),
+        "Rows_Per_Second": round(rows / seconds) if seconds > 0 else None,
+        "Error": job.Error,
+        "Errors": errors,
+    }
+
+
+def run(source, kind, fmt, name=None, chunk_size=IMPORT_CHUNK_SIZE, with_activity=True, progress=None):
+    """Import (or resume importing) a seekable CSV/Parquet file into `kind`'s table; returns a summary.
+
+    `progress(summary)` is called after every committed chunk.
+    """
+    if kind not in TABLES:
+        raise ValueError(f"Unknown import target '{kind}' (expected one of: {', '.join(TABLES)})")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}' (expected one of: {', '.join(FORMATS)})")
+    validate = validate_order if kind == "customer-order" else validate_activity
+    import_id = f"{kind}:{fingerprint(source)[:32]}"
+    started = time.perf_counter()
+    rows = 0
+    errors = []
+
+    with SessionLocal() as db:
+        job = db.get(models.ImportJob, import_id)
+        if job is None:
+            job = models.ImportJob(
+                Import_ID=import_id,
+                Table_Name=TABLES[kind].__tablename__,
+                Source=name,
+                Status="running",
+                Rows_Done=0,
+                Rows_Imported=0,
+                Rows_Failed=0,
+                Started_At=datetime.now(),
+            )
+            db.add(job)
+            db.commit()
+        elif job.Status == "done":
+            return _summary(job, 0.0, 0, [])
+        job.Status, job.Error, job.Finished_At = "running", None, None
+        db.commit()
+
+        offset = 0
+        for frame in inventory_bulk.read_chunks(source, fmt, chunk_size):
+            end = offset + len(frame)
+            if end <= job.Rows_Done:  # ✅ Committed by an earlier run
+                offset = end
+                continue
+            frame = frame.iloc[max(job.Rows_Done - offset, 0):].reset_index(drop=True)
+            first = end - len(frame)
+            clean, rejected = validate(frame)
+            try:
+                if not clean.empty:
+                    write_chunk(db, kind, clean, with_activity)
+                job.Rows_Done = end
+                job.Rows_Imported += len(clean)
+                job.Rows_Failed += len(rejected)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                job.Status, job.Error, job.Finished_At = "failed", f"{e.__class__.__name__} at row {first}: {e}"[:500], datetime.now()
+                db.commit()
+                return _summary(job, time.perf_counter() - started, rows, errors)
+
+            rows += len(frame)
+            for position, error in rejected.items():
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({"row": first + position, "error": error})
+            offset = end
+            if progress is not None:
+                progress(_summary(job, time.perf_counter() - started, rows, errors))
+
+        job.Status, job.Finished_At = "done", datetime.now()
+        db.commit()
+        return _summary(job, time.perf_counter() - started, rows, errors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=list(TABLES))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--no-activity", action="store_true", help="don't derive daily activity from imported orders")
+    args = parser.parse_args()
+
+    fmt = args.format or inventory_bulk.detect_format(None, args.path)
+    if fmt not in FORMATS:
+        raise SystemExit(f"Can't tell the format of {args.path}; pass --format")
+
+    def report(summary):
+        print(f"   {summary['Rows_Done']} row(s) done, {summary['Rows_Failed']} rejected, {summary['Rows_Per_Second']} rows/s")
+
+    with open(args.path, "rb") as source:
+        summary = run(source, args.kind, fmt, os.path.basename(args.path), args.chunk_size, not args.no_activity, report)
+    for error in summary["Errors"]:
+        print(f"   row {error['row']}: {error['error']}")
+    if summary["Status"] != "done":
+        raise SystemExit(f"❌ Import failed ({summary['Error']}); run the same command again to resume")
+    print(
+        f"✅ Imported {summary['Rows_Imported']} row(s) into {summary['Table']} "
+        f"({summary['Rows_Failed']} rejected, {summary['Rows_This_Run']} this run, {summary['Rows_Per_Second']} rows/s)"
+    )
@@ -0,0 +1,112 @@
+"""Shrink uploaded photos before they are sent to Gemini.
+
+Phone photos are 12 MP or more, far beyond what food recognition needs.
+`read_limited` refuses uploads over IMAGE_MAX_UPLOAD_BYTES without reading
+all of them. `prepare` then works in four steps:
+
+1. Decode. For JPEGs this uses PIL's draft mode, which decodes at 1/2, 1/4
+   or 1/8 scale straight from the DCT, so the full-resolution bitmap is
+   never built.
+2. Apply the EXIF rotation.
+3. Resize so the longest edge is at most IMAGE_MAX_EDGE.
+4. Re-encode as JPEG at IMAGE_JPEG_QUALITY.
+
+A JPEG that is already upright and within IMAGE_MAX_EDGE is sent as it came:
+re-encoding it would only add generation loss and, usually, bytes.
+
+It logs the input and output bytes and the time spent in each step.
+"""
+import io
+import logging
+import os
+import time
+
+from PIL import Image, ImageOps
+
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(20 * 2 ** 20)))
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+READ_BLOCK_BYTES = 2 ** 20
+ORIENTATION_TAG = 0x0112  # EXIF Orientation; 1 means no rotation
+
+logger = logging.getLogger(__name__)
+
+
+class ImageTooLarge(ValueError):
+    """The upload is over IMAGE_MAX_UPLOAD_BYTES."""
+
+
+async def read_limited(upload, limit=IMAGE_MAX_UPLOAD_BYTES):
+    """Read an UploadFile, giving up as soon as it passes `limit` bytes."""
+    started = time.perf_counter()
+    blocks = []
+    size = 0
+    while True:
+        block = await upload.read(READ_BLOCK_BYTES)
+        if not block:
+            logger.info("Read %d B upload in %.1f ms", size, (time.perf_counter() - started) * 1000)
+            return b"".join(blocks)
+        size += len(block)
+        if size > limit:
+            raise ImageTooLarge(f"Image is larger than {limit // 2 ** 20} MB")
+        blocks.append(block)
+
+
+def prepare(content, max_edge=IMAGE_MAX_EDGE, quality=IMAGE_JPEG_QUALITY):
+    """Decode at reduced scale, orient, resize and re-encode; returns (JPEG bytes, stats).
+
+    Small upright RGB/greyscale JPEGs are returned unchanged (stats["passthrough"] is True).
+
+    Raises ValueError when the content isn't a readable image.
+    """
+    timings = {}
+    started = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(content))
+        original_size = image.size
+        plain_jpeg = image.format == "JPEG" and image.mode in ("RGB", "L")
+        upright = image.getexif().get(ORIENTATION_TAG, 1) == 1
+        scale = max_edge / max(original_size)
+        if scale < 1:
+            # ✅ JPEG only: the smallest DCT scale whose longest edge is still >= max_edge
+            image.draft("RGB", (round(original_size[0] * scale), round(original_size[1] * scale)))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"Unreadable image: {e}") from e
+    timings["decode"] = time.perf_counter() - started
+
+    step = time.perf_counter()
+    decoded_size = image.size
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_edge, max_edge), Image.BICUBIC)
+    timings["resize"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    # ✅ Nothing to fix: re-encoding would only lose quality and grow the file (72 KB -> 85 KB on kitchen.jpeg)
+    passthrough = plain_jpeg and upright and image.size == original_size
+    if passthrough:
+        jpeg = content
+    else:
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=quality, optimize=True)
+        jpeg = output.getvalue()
+    timings["encode"] = time.perf_counter() - step
+
+    stats = {
+        "input_bytes": len(content),
+        "output_bytes": len(jpeg),
+        "original_size": original_size,
+        "decoded_size": decoded_size,
+        "output_size": image.size,
+        "passthrough": passthrough,
+        **{f"{name}_ms": round(seconds * 1000, 1) for name, seconds in timings.items()},
+    }
+    logger.info(
+        "Image %dx%d %d B -> %dx%d %d B%s (draft %dx%d; decode %.1f ms, resize %.1f ms, encode %.1f ms)",
+        *original_size, stats["input_bytes"], *image.size, stats["output_bytes"],
+        " (unchanged)" if passthrough else "", *decoded_size,
+        stats["decode_ms"], stats["resize_ms"], stats["encode_ms"],
+    )
+    return jpeg, stats
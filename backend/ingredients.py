@@ -0,0 +1,140 @@
+"""Compile Recipe.Ingredients into normalized recipe_ingredient rows and read them back.
+
+An amount is only kept in its ingredient's base unit. One that can't be, e.g.
+"2 pcs" of an ingredient measured in g, becomes None: orders and menus then
+report the dish's quantity as invalid instead of mixing units.
+"""
+import logging
+
+import models
+import units
+
+logger = logging.getLogger(__name__)
+
+
+def get_or_create_ingredients(db, base_units):
+    """Fetch canonical ingredients by name, creating missing ones with the given base unit."""
+    if not base_units:
+        return {}
+
+    existing = {
+        ingredient.Name: ingredient
+        for ingredient in db.query(models.Ingredient).filter(models.Ingredient.Name.in_(sorted(base_units)))
+    }
+    for name, base_unit in base_units.items():
+        if name not in existing:
+            existing[name] = models.Ingredient(Name=name, Base_Unit=base_unit)
+            db.add(existing[name])
+    db.flush()
+    return existing
+
+
+def parse_recipe(recipe):
+    """Parse one recipe's JSON ingredients into {canonical_name: (quantity, base_unit)}.
+
+    Quantity is None when the string has no leading number. Repeated names are
+    summed when they share a base unit; otherwise the quantity is None.
+    """
+    parsed = {}
+    for ingredient, required_quantity in (recipe.Ingredients or {}).items():
+        name = units.canonical_name(ingredient)
+        quantity = units.parse_quantity(required_quantity)
+        amount, base_unit = quantity if quantity is not None else (None, "pcs")
+
+        if name in parsed:
+            previous, previous_unit = parsed[name]
+            if previous is None or amount is None:
+                base_unit = base_unit if previous is None else previous_unit  # The unit of whichever amount parsed
+                amount = None
+            elif base_unit != previous_unit:
+                logger.warning("Recipe %r lists %r in both %s and %s; its quantity is unusable",
+                               recipe.Dish_Name, name, previous_unit, base_unit)
+                amount, base_unit = None, previous_unit
+            else:
+                amount += previous
+        parsed[name] = (amount, base_unit)
+    return parsed
+
+
+def compile_recipes(db, recipes):
+    """Write recipe_ingredient rows for already-flushed `recipes`, replacing any existing ones."""
+    parsed = {recipe.Recipe_ID: parse_recipe(recipe) for recipe in recipes}
+    base_units = {}
+    for with_amount in (True, False):  # ✅ A new ingredient takes the unit of an amount that parsed, if any
+        for rows in parsed.values():
+            for name, (amount, base_unit) in rows.items():
+                if (amount is not None) == with_amount:
+                    base_units.setdefault(name, base_unit)
+
+    canonical = get_or_create_ingredients(db, base_units)
+
+    db.query(models.RecipeIngredient).filter(
+        models.RecipeIngredient.Recipe_ID.in_(list(parsed))
+    ).delete(synchronize_session=False)
+
+    for recipe_id, rows in parsed.items():
+        for name, (amount, base_unit) in rows.items():
+            if amount is not None and base_unit != canonical[name].Base_Unit:
+                # ✅ Never store an amount in a unit the ingredient isn't measured in
+                logger.warning("Recipe %s needs %r in %s but it is measured in %s; its quantity is unusable",
+                               recipe_id, name, base_unit, canonical[name].Base_Unit)
+                amount = None
+            db.add(models.RecipeIngredient(
+                Recipe_ID=recipe_id,
+                Ingredient_ID=canonical[name].Ingredient_ID,
+                Quantity=amount,
+            ))
+    db.flush()
+
+
+def compile_missing(db, batch_size=500):
+    """Backfill recipe_ingredient rows for recipes compiled before the table existed."""
+    compiled_ids = db.query(models.RecipeIngredient.Recipe_ID).distinct()
+    missing = (
+        db.query(models.Recipe)
+        .filter(models.Recipe.Recipe_ID.notin_(compiled_ids))
+        .order_by(models.Recipe.Recipe_ID)
+        .all()
+    )
+    missing = [recipe for recipe in missing if recipe.Ingredients]
+    for start in range(0, len(missing), batch_size):
+        compile_recipes(db, missing[start:start + batch_size])
+    return len(missing)
+
+
+def requirements_for(db, recipes):
+    """Pre-parsed requirements for `recipes` in one query.
+
+    Returns ({Recipe_ID: [(ingredient_name, quantity)]}, {ingredient_name: base_unit}).
+    Recipes that were never compiled are parsed in memory so reads stay correct
+    until the backfill migration has run.
+    """
+    requirements = {recipe.Recipe_ID: [] for recipe in recipes}
+    base_units = {}
+    if not requirements:
+        return requirements, base_units
+
+    rows = (
+        db.query(
+            models.RecipeIngredient.Recipe_ID,
+            models.Ingredient.Name,
+            models.Ingredient.Base_Unit,
+            models.RecipeIngredient.Quantity,
+        )
+        .join(models.Ingredient, models.Ingredient.Ingredient_ID == models.RecipeIngredient.Ingredient_ID)
+        .filter(models.RecipeIngredient.Recipe_ID.in_(list(requirements)))
+        .order_by(models.RecipeIngredient.Recipe_ID, models.Ingredient.Name)
+        .all()
+    )
+    for recipe_id, name, base_unit, quantity in rows:
+        requirements[recipe_id].append((name, quantity))
+        base_units[name] = base_unit
+
+    for recipe in recipes:
+        if not requirements[recipe.Recipe_ID] and recipe.Ingredients:
+            for name, (amount, base_unit) in parse_recipe(recipe).items():
+                if base_units.setdefault(name, base_unit) != base_unit:
+                    amount = None  # Same rule as compile_recipes
+                requirements[recipe.Recipe_ID].append((name, amount))
+
+    return requirements, base_units
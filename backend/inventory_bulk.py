@@ -0,0 +1,171 @@
+"""Bulk inventory intake for POST /inventory/bulk (JSON array, CSV or Parquet).
+
+Uploads are spooled to disk and read back in chunks of BULK_CHUNK_SIZE rows.
+Each chunk is validated with vectorized pandas checks. The valid rows go to
+the database in ONE `INSERT ... ON CONFLICT (Item_Name, Expiry_Date) DO
+UPDATE` that adds to an existing lot's quantity, exactly like POST
+/inventory/ does for a single item. The ledger receipts and change-feed
+entries are written in the same transaction, and each chunk commits on its
+own. Every input row gets a result: inserted, updated or error.
+"""
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import ledger
+from database import SessionLocal
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_SPOOL_BYTES = 8 * 2 ** 20  # Uploads larger than this are spooled to a temporary file
+FORMATS = ("json", "csv", "parquet")
+REQUIRED_COLUMNS = ["Item_Name", "Category", "Quantity", "Unit", "Price_per_Unit", "Expiry_Date", "Storage_Location"]
+OPTIONAL_COLUMNS = {"Detected_By_AI": False, "Confidence_Score": 1.0}
+
+
+def detect_format(content_type, filename=None, requested=None):
+    """The upload format from ?format=, the file name or the content type (None if unknown)."""
+    if requested:
+        return requested if requested in FORMATS else None
+    suffix = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if suffix in FORMATS:
+        return suffix
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type.endswith("json"):
+        return "json"
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if "parquet" in content_type:
+        return "parquet"
+    return None
+
+
+async def spool(chunks):
+    """Copy an async byte stream into a (seeked) spooled temporary file."""
+    source = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES)
+    async for chunk in chunks:
+        source.write(chunk)
+    source.seek(0)
+    return source
+
+
+def read_chunks(source, fmt, chunk_size=BULK_CHUNK_SIZE):
+    """Yield DataFrames of at most `chunk_size` input rows."""
+    if fmt == "csv":
+        yield from pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        rows = json.load(source)
+        if not isinstance(rows, list):
+            raise ValueError("Expected a JSON array of inventory items")
+        for start in range(0, len(rows), chunk_size):
+            yield pd.DataFrame.from_records([row if isinstance(row, dict) else {} for row in rows[start:start + chunk_size]])
+
+
+def _flag(errors, mask, message):
+    errors[mask] = errors[mask] + message + "; "
+
+
+def validate(frame):
+    """Vectorized checks for one chunk: (clean DataFrame of valid rows, {position: error})."""
+    errors = pd.Series("", index=frame.index, dtype=object)
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        return frame.iloc[0:0], {position: f"Missing column(s): {', '.join(missing)}" for position in range(len(frame))}
+
+    clean = pd.DataFrame(index=frame.index)
+    for column in ("Item_Name", "Category", "Unit", "Storage_Location"):
+        clean[column] = frame[column].astype(str).str.strip()
+        _flag(errors, frame[column].isna() | (clean[column] == ""), f"{column} is required")
+    for column in ("Quantity", "Price_per_Unit"):
+        clean[column] = pd.to_numeric(frame[column], errors="coerce")
+        _flag(errors, clean[column].isna() | (clean[column] < 0), f"{column} must be a non-negative number")
+    # ✅ Offsets are normalized to naive UTC; naive timestamps are kept as given
+    clean["Expiry_Date"] = pd.to_datetime(frame["Expiry_Date"], errors="coerce", utc=True, format="mixed").dt.tz_convert(None)
+    _flag(errors, clean["Expiry_Date"].isna(), "Expiry_Date must be a date")
+
+    if "Detected_By_AI" in frame.columns:
+        flags = frame["Detected_By_AI"].astype(str).str.strip().str.lower()
+        clean["Detected_By_AI"] = flags.isin(["true", "1", "yes"])
+    else:
+        clean["Detected_By_AI"] = OPTIONAL_COLUMNS["Detected_By_AI"]
+    if "Confidence_Score" in frame.columns:
+        clean["Confidence_Score"] = pd.to_numeric(frame["Confidence_Score"], errors="coerce").fillna(OPTIONAL_COLUMNS["Confidence_Score"])
+    else:
+        clean["Confidence_Score"] = OPTIONAL_COLUMNS["Confidence_Score"]
+
+    failed = errors != ""
+    positions = np.flatnonzero(failed.to_numpy())
+    return clean[~failed], {int(position): errors.iat[position].rstrip("; ") for position in positions}
+
+
+def upsert_chunk(db, clean):
+    """Upsert one chunk's valid rows in a single statement; returns {(Item_Name, Expiry_Date): (Item_ID, status)}.
+
+    Rows repeating a (Item_Name, Expiry_Date) within the chunk are summed first
+    (ON CONFLICT can't touch a row twice), and rows are sent in lock order.
+    """
+    merged = (
+        clean.groupby(["Item_Name", "Expiry_Date"], sort=True)
+        .agg(
+            Category=("Category", "last"),
+            Quantity=("Quantity", "sum"),
+            Unit=("Unit", "last"),
+            Price_per_Unit=("Price_per_Unit", "last"),
+            Storage_Location=("Storage_Location", "last"),
+            Detected_By_AI=("Detected_By_AI", "last"),
+            Confidence_Score=("Confidence_Score", "last"),
+        )
+        .reset_index()
+    )
+    lots = [dict(row, Expiry_Date=row["Expiry_Date"].to_pydatetime()) for row in merged.to_dict(orient="records")]
+    return {
+        (lot["Item_Name"], lot["Expiry_Date"]): (lot["Item_ID"], "inserted" if inserted else "updated")
+        for lot, inserted in ledger.receive(db, lots, reference="bulk")
+    }
+
+
+def ingest(source, fmt, chunk_size=BULK_CHUNK_SIZE):
+    """Validate and upsert an upload chunk by chunk; returns totals and per-row results."""
+    started = time.perf_counter()
+    results = []
+    offset = 0
+    with SessionLocal() as db:
+        for frame in read_chunks(source, fmt, chunk_size):
+            frame = frame.reset_index(drop=True)
+            clean, errors = validate(frame)
+            outcome = {}
+            if not clean.empty:
+                try:
+                    outcome = upsert_chunk(db, clean)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    errors.update({int(position): f"Chunk failed: {e.__class__.__name__}" for position in clean.index})
+                    outcome = {}
+
+            for position in range(len(frame)):
+                if position in errors:
+                    results.append({"row": offset + position, "status": "error", "error": errors[position]})
+                    continue
+                row = clean.loc[position]
+                item_id, status = outcome[(row["Item_Name"], row["Expiry_Date"].to_pydatetime())]
+                results.append({"row": offset + position, "status": status, "Item_ID": item_id})
+            offset += len(frame)
+
+    counts = {status: sum(1 for result in results if result["status"] == status) for status in ("inserted", "updated", "error")}
+    return {
+        "rows": len(results),
+        "inserted": counts["inserted"],
+        "updated": counts["updated"],
+        "failed": counts["error"],
+        "seconds": round(time.perf_counter() - started, 3),
+        "results": results,
+    }
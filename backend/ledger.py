@@ -0,0 +1,230 @@
+"""Append-only stock movement ledger with periodic per-lot snapshots.
+
+InventoryItem.Quantity stays the materialized current value that order placement
+locks; every change to it is also appended here as a movement. Stock at any
+timestamp is the latest snapshot before it plus the short tail of movements after.
+
+A movement gets its ID when its transaction flushes but only becomes visible
+when it commits, and nothing below a snapshot's Movement_ID is read again. So
+a snapshot only folds IDs up to the newest movement created at least
+LEDGER_SETTLE_SECONDS ago. Every lower ID was flushed before that one and has
+committed (or rolled back) by then, as long as the window is more than twice
+the longest stock-changing transaction. Later IDs wait for the next snapshot.
+
+Take snapshots periodically (cron or POST /inventory/snapshots):
+
+    python ledger.py snapshot
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert
+
+import changes
+import models
+from database import upsert
+
+LEDGER_SETTLE_SECONDS = float(os.getenv("LEDGER_SETTLE_SECONDS", "10"))
+
+RECEIPT = "receipt"
+SALE = "sale"
+WASTE = "waste"
+ADJUSTMENT = "adjustment"
+
+
+def naive_utc(value):
+    """A datetime or ISO 8601 string as a naive UTC datetime, the way the DateTime columns hold it.
+
+    Raises ValueError for a string that isn't a date.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def movement(lot, movement_type, delta, reference=None, at=None):
+    """Build (but don't add) a movement row for a lot that already has an Item_ID."""
+    return models.StockMovement(
+        Item_ID=lot.Item_ID,
+        Item_Name=lot.Item_Name,
+        Movement_Type=movement_type,
+        Quantity_Delta=delta,
+        Date_Time=at or datetime.now(),
+        Reference=reference,
+    )
+
+
+def record(db, lot, movement_type, delta, reference=None):
+    """Append a movement for `lot`; zero deltas are skipped."""
+    if delta:
+        db.add(movement(lot, movement_type, delta, reference))
+
+
+def receive(db, lots, reference=None):
+    """Add stock by (Item_Name, Expiry_Date) in ONE `INSERT ... ON CONFLICT DO UPDATE`.
+
+    A lot that already exists gets the quantity added (and the new price and
+    location); otherwise it is inserted. Receipt movements and change-feed
+    entries go in the same transaction. `lots` are dicts of InventoryItem
+    columns, one per (Item_Name, Expiry_Date), sent in that (lock) order.
+    Returns [(lot row after the upsert, inserted)], one per lot.
+    """
+    if not lots:
+        return []
+    # ✅ RETURNING gives naive datetimes back, so the keys below must be naive too
+    lots = [dict(lot, Expiry_Date=naive_utc(lot["Expiry_Date"])) for lot in lots]
+    table = models.InventoryItem.__table__
+    statement = upsert(db.get_bind(), table).values([dict(lot, Version=1) for lot in lots])
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.Item_Name, table.c.Expiry_Date],
+        set_={
+            "Quantity": table.c.Quantity + statement.excluded.Quantity,
+            "Price_per_Unit": statement.excluded.Price_per_Unit,
+            "Storage_Location": statement.excluded.Storage_Location,
+            "Version": table.c.Version + 1,  # ✅ Keep the optimistic lock honest for in-flight orders
+        },
+    ).returning(*table.columns)
+
+    received = {(lot["Item_Name"], lot["Expiry_Date"]): lot["Quantity"] for lot in lots}
+    now = datetime.now()
+    movements = []
+    results = []
+    for lot in db.execute(statement).mappings():
+        inserted = lot["Version"] == 1
+        results.append((lot, inserted))
+        movements.append({
+            "Item_ID": lot["Item_ID"],
+            "Item_Name": lot["Item_Name"],
+            "Movement_Type": RECEIPT,
+            "Quantity_Delta": received[(lot["Item_Name"], lot["Expiry_Date"])],
+            "Date_Time": now,
+            "Reference": reference,
+        })
+        if inserted:
+            changes.record(db, table.name, changes.INSERT, lot["Item_ID"], {k: changes.jsonable(v) for k, v in lot.items()})
+        else:
+            patch = {k: changes.jsonable(lot[k]) for k in ("Quantity", "Price_per_Unit", "Storage_Location", "Version")}
+            changes.record(db, table.name, changes.UPDATE, lot["Item_ID"], patch)
+    db.execute(insert(models.StockMovement), movements)
+    return results
+
+
+def positions(db, at=None, item_name=None, upto=None):
+    """Per-lot stock at `at` (default now) as {Item_ID: {...}}, folding movements up to Movement_ID `upto` if given.
+
+    Each entry holds Item_Name, Quantity, the last Movement_ID folded in and
+    Tail, the number of movements read on top of the snapshot.
+    """
+    at = at or datetime.now()
+
+    latest = (
+        db.query(
+            models.StockSnapshot.Item_ID.label("Item_ID"),
+            func.max(models.StockSnapshot.Movement_ID).label("Movement_ID"),
+        )
+        .filter(models.StockSnapshot.Date_Time <= at)
+        .group_by(models.StockSnapshot.Item_ID)
+        .subquery()
+    )
+
+    snapshots = db.query(
+        models.StockSnapshot.Item_ID,
+        models.StockSnapshot.Item_Name,
+        models.StockSnapshot.Quantity,
+        models.StockSnapshot.Movement_ID,
+    ).join(
+        latest,
+        (models.StockSnapshot.Item_ID == latest.c.Item_ID)
+        & (models.StockSnapshot.Movement_ID == latest.c.Movement_ID),
+    )
+    tail = (
+        db.query(
+            models.StockMovement.Item_ID,
+            func.max(models.StockMovement.Item_Name),
+            func.sum(models.StockMovement.Quantity_Delta),
+            func.max(models.StockMovement.Movement_ID),
+            func.count(models.StockMovement.Movement_ID),
+        )
+        .outerjoin(latest, latest.c.Item_ID == models.StockMovement.Item_ID)
+        .filter(
+            models.StockMovement.Date_Time <= at,
+            models.StockMovement.Movement_ID > func.coalesce(latest.c.Movement_ID, 0),
+        )
+        .group_by(models.StockMovement.Item_ID)
+    )
+    if upto is not None:
+        tail = tail.filter(models.StockMovement.Movement_ID <= upto)
+    if item_name:
+        snapshots = snapshots.filter(models.StockSnapshot.Item_Name == item_name)
+        tail = tail.filter(models.StockMovement.Item_Name == item_name)
+
+    stock = {}
+    for item_id, name, quantity, movement_id in snapshots:
+        stock[item_id] = {"Item_Name": name, "Quantity": quantity, "Movement_ID": movement_id, "Tail": 0}
+    for item_id, name, delta, movement_id, count in tail:
+        entry = stock.setdefault(item_id, {"Item_Name": name, "Quantity": 0.0, "Movement_ID": 0, "Tail": 0})
+        entry["Quantity"] += delta
+        entry["Movement_ID"] = movement_id
+        entry["Tail"] = count
+    return stock
+
+
+def stock_at(db, at=None, item_name=None):
+    """Stock per lot at a point in time, as a list sorted by Item_ID."""
+    return [
+        {"Item_ID": item_id, "Item_Name": entry["Item_Name"], "Quantity": round(entry["Quantity"], 6)}
+        for item_id, entry in sorted(positions(db, at, item_name).items())
+    ]
+
+
+def settled_movement_id(db, cutoff):
+    """The newest Movement_ID created by `cutoff`: it and every lower ID are committed once the window has passed."""
+    return (
+        db.query(func.max(models.StockMovement.Movement_ID))
+        .filter(models.StockMovement.Date_Time <= cutoff)
+        .scalar()
+    ) or 0
+
+
+def take_snapshots(db, at=None):
+    """Snapshot every lot with settled movements since its last snapshot; returns how many were written."""
+    at = at or datetime.now()
+    upto = settled_movement_id(db, at - timedelta(seconds=LEDGER_SETTLE_SECONDS))
+    written = 0
+    for item_id, entry in positions(db, at, upto=upto).items():
+        if not entry["Tail"]:
+            continue
+        db.add(models.StockSnapshot(
+            Item_ID=item_id,
+            Item_Name=entry["Item_Name"],
+            Quantity=entry["Quantity"],
+            Movement_ID=entry["Movement_ID"],
+            Date_Time=at,
+        ))
+        written += 1
+    return written
+
+
+def seed_opening_balances(db):
+    """Record an opening-balance movement for lots that predate the ledger."""
+    tracked = db.query(models.StockMovement.Item_ID).distinct()
+    seeded = 0
+    for lot in db.query(models.InventoryItem).filter(models.InventoryItem.Item_ID.notin_(tracked)):
+        record(db, lot, ADJUSTMENT, lot.Quantity or 0.0, reference="opening-balance")
+        seeded += 1
+    return seeded
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["snapshot"]:
+        raise SystemExit("Usage: python ledger.py snapshot")
+
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        written = take_snapshots(db)
+        db.commit()
+    print(f"✅ Wrote {written} stock snapshot(s)")
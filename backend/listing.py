@@ -0,0 +1,185 @@
+"""Keyset-paginated, column-projected and streamed list endpoints.
+
+Shared by GET /inventory/, /customer-order/, /daily-activity/ and /recipe/:
+
+    ?fields=Item_Name,Quantity     only select these columns
+    ?limit=500&after=<cursor>      one page; the next cursor is in X-Next-Cursor
+    ?order=time                    page by (Date_Time, primary key) instead of the primary key
+    ?format=ndjson                 one JSON object per line
+
+Every response carries X-Change-Version, the change-feed version the listing
+is at least as new as, so a client can load a table and then follow
+GET /changes/stream?since=<that version>.
+
+Without `limit` the whole table is streamed (as a JSON array, or NDJSON) from
+a server-side cursor in batches of STREAM_BATCH_SIZE rows, so memory stays
+flat however large the table gets.
+
+`respond_async` serves the same listings from an AsyncSession, for the
+endpoints that run on the event loop.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+
+import changes
+from database import AsyncSessionLocal, SessionLocal
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib encoder
+    orjson = None
+
+MAX_PAGE_SIZE = 10000
+STREAM_BATCH_SIZE = 1000
+FORMATS = ("json", "ndjson")
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    """Serialize to JSON bytes, with orjson when it's installed."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(dumps(list(values))).decode().rstrip("=")
+
+
+def decode_cursor(cursor, key_columns):
+    """Turn an opaque `after` cursor back into key values typed like `key_columns`."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(values) != len(key_columns):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value) if column.type.python_type is datetime else value
+            for column, value in zip(key_columns, values)
+        ]
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="⚠ Invalid pagination cursor.")
+
+
+def key_columns(model, order):
+    """Columns a listing is ordered and paged by: the primary key, optionally after Date_Time."""
+    primary_key = list(model.__table__.primary_key.columns)
+    if order == "id":
+        return primary_key
+    if order == "time" and "Date_Time" in model.__table__.c:
+        return [model.__table__.c.Date_Time] + primary_key
+    raise HTTPException(status_code=400, detail=f"⚠ Can't order {model.__tablename__} by '{order}'.")
+
+
+def project(model, fields):
+    """Columns named in a comma-separated `fields` (default: all of them)."""
+    table = model.__table__
+    if not fields:
+        return list(table.columns)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in table.c]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"⚠ Unknown field(s): {', '.join(unknown)}")
+    return [table.c[name] for name in dict.fromkeys(names)]
+
+
+def after(keys, values):
+    """Keyset predicate (k1, k2, ...) > (v1, v2, ...) that every backend can index."""
+    clauses = []
+    for i, (column, value) in enumerate(zip(keys, values)):
+        clauses.append(and_(*[keys[j] == values[j] for j in range(i)], column > value))
+    return or_(*clauses)
+
+
+def _encode(batch, names, fmt, first):
+    """Bytes for one batch of streamed rows; `first` opens the JSON array."""
+    if fmt == "ndjson":
+        return b"".join(dumps(dict(zip(names, row))) + b"\n" for row in batch)
+    return (b"[" if first else b",") + b",".join(dumps(dict(zip(names, row))) for row in batch)
+
+
+def _closing(fmt, first):
+    if fmt == "ndjson":
+        return b""
+    return b"[]" if first else b"]"
+
+
+def _stream(query, names, fmt):
+    with SessionLocal() as db:
+        rows = db.execute(query.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE))
+        first = True
+        for batch in rows.partitions():
+            yield _encode(batch, names, fmt, first)
+            first = False
+        yield _closing(fmt, first)
+
+
+async def _stream_async(query, names, fmt):
+    async with AsyncSessionLocal() as db:
+        rows = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        first = True
+        async for batch in rows.partitions():
+            yield _encode(batch, names, fmt, first)
+            first = False
+        yield _closing(fmt, first)
+
+
+def plan(model, fields=None, cursor=None, order="id", fmt="json"):
+    """(query, names, keys, position) for a listing; see the module docstring for the parameters."""
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"⚠ Format must be one of: {', '.join(FORMATS)}.")
+    keys = key_columns(model, order)
+    columns = project(model, fields)
+    names = [column.name for column in columns]
+
+    # ✅ Key columns are always selected (to build the next cursor) but only requested fields are returned
+    extra = [key for key in keys if key.name not in names]
+    query = select(*columns, *extra).order_by(*keys)
+    if cursor:
+        query = query.where(after(keys, decode_cursor(cursor, keys)))
+    position = {column.name: i for i, column in enumerate(columns + extra)}
+    return query, names, keys, position
+
+
+def page(rows, names, keys, position, limit, fmt, headers):
+    """One page of rows as a response, with X-Next-Cursor when there may be more."""
+    records = [dict(zip(names, row)) for row in rows]
+    if len(rows) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1][position[key.name]] for key in keys)
+    if fmt == "ndjson":
+        body = b"".join(dumps(record) + b"\n" for record in records)
+        return Response(content=body, media_type="application/x-ndjson", headers=headers)
+    return Response(content=dumps(records), media_type="application/json", headers=headers)
+
+
+def _streamed(rows, fmt, headers):
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return StreamingResponse(rows, media_type=media_type, headers=headers)
+
+
+def respond(db, model, fields=None, limit=None, cursor=None, order="id", fmt="json"):
+    """List `model` rows as requested; see the module docstring for the parameters."""
+    query, names, keys, position = plan(model, fields, cursor, order, fmt)
+    headers = {"X-Change-Version": str(changes.latest(db))}
+    if limit is None:
+        return _streamed(_stream(query, names, fmt), fmt, headers)
+    return page(db.execute(query.limit(limit)).all(), names, keys, position, limit, fmt, headers)
+
+
+async def respond_async(db, model, fields=None, limit=None, cursor=None, order="id", fmt="json"):
+    """`respond` on an AsyncSession: queries and streaming never block the event loop."""
+    query, names, keys, position = plan(model, fields, cursor, order, fmt)
+    headers = {"X-Change-Version": str(await db.run_sync(changes.latest))}
+    if limit is None:
+        return _streamed(_stream_async(query, names, fmt), fmt, headers)
+    rows = (await db.execute(query.limit(limit))).all()
+    return page(rows, names, keys, position, limit, fmt, headers)
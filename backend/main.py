@@ -1,37 +1,50 @@
-from fastapi import FastAPI, Depends, File, UploadFile, HTTPException, Query
-import google.generativeai as genai
+from fastapi import FastAPI, Depends, File, Header, UploadFile, HTTPException, Query, Request, Response
 from pydantic import BaseModel, Field
-from PIL import Image
-import io
+import asyncio
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import date, datetime
 import models
+import ingredients
+import caching
+import changes
+import forecast_store
+import gemini
+import image_prep
+import ledger
+import listing
+import menu_engine
+import orders
+import rollups
+import video_stock
+import vision_cache
 import re
-from database import SessionLocal, engine
-import pandas as pd
-from prophet import Prophet
-from statsmodels.tsa.arima.model import ARIMA
-from xgboost import XGBRegressor
-import numpy as np
+from database import AsyncSessionLocal, SessionLocal, dispose_async_engine, engine
 import json
-from typing import Dict, Union
-from models import DailyActivity  # Add this line
-from models import InventoryItem
-import requests
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
+# ✅ Forecasting, analytics and Gemini libraries are imported on first use, so workers boot fast.
+# Check with: python bench_startup.py
 
+SCHEMA_AUTO_CREATE = os.getenv("SCHEMA_AUTO_CREATE", "1") == "1"  # Set to 0 where `python migrate.py` owns the schema
 
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app):
+    if SCHEMA_AUTO_CREATE:
+        models.Base.metadata.create_all(bind=engine)  # ✅ At startup, not import, so importing main needs no database
+    forecast_store.start_scheduler()  # ✅ Background incremental refits
+    yield
+    forecast_store.stop_scheduler()
+    await dispose_async_engine()
 
-# ===========================
-# CONFIGURE GEMINI API
-# ===========================
-GEMINI_API_KEY = "gemini-key"  # Replace with a secure method
-genai.configure(api_key=GEMINI_API_KEY)
-
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -50,6 +63,11 @@ def get_db():
     finally:
         db.close()
 
+# ✅ Async Database Dependency for the hot endpoints: no threadpool hop, so concurrency is bounded by DB_POOL_SIZE
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # ✅ Pydantic Model for Inventory
 class InventoryItemRequest(BaseModel):
     Item_Name: str
@@ -89,6 +107,16 @@ class CustomerOrderRequest(BaseModel):
     Items_Ordered: dict
     Total_Bill: float
     Order_Status: str
+    Cart_ID: str | None = None  # ✅ Consume this cart's stock reservation
+
+class WasteRequest(BaseModel):
+    Quantity: float = Field(gt=0)
+    Reason: str | None = None
+
+class ReservationRequest(BaseModel):
+    Cart_ID: str | None = None  # Omit to start a new cart
+    Items_Ordered: dict
+    TTL_Seconds: int | None = Field(default=None, gt=0)
 
 class RecipeRequest(BaseModel):
     Dish_Name: str
@@ -99,13 +127,32 @@ class RecipeRequest(BaseModel):
     price: float  # Changed to lowercase
 
 
+# ✅ Gemini through the shared limiter: 503 when the queue is full, 502 when it never answers
+async def call_gemini(contents):
+    try:
+        return await gemini.generate(contents)
+    except gemini.GeminiBusy as e:
+        raise HTTPException(status_code=503, detail=f"⚠ AI service busy: {e}", headers={"Retry-After": "1"})
+    except gemini.GeminiError as e:
+        raise HTTPException(status_code=502, detail=f"⚠ AI service unavailable: {e}")
+
+@app.get("/gemini/status")
+def gemini_status():
+    return gemini.metrics()
+
+
+@app.get("/analyze-food/cache")
+def vision_cache_stats():
+    return vision_cache.stats()
+
+
 # ===========================
 # GENERATE DISHES BASED ON INVENTORY
 # ===========================
 @app.get("/generate-dishes/")
-def generate_dishes(db: Session = Depends(get_db)):
+async def generate_dishes(db: Session = Depends(get_db)):
     # Fetch available inventory
-    inventory_items = db.query(models.InventoryItem).all()
+    inventory_items = await run_in_threadpool(lambda: db.query(models.InventoryItem).all())
     
     if not inventory_items:
         return {"message": "No ingredients available in inventory."}
@@ -117,7 +164,6 @@ def generate_dishes(db: Session = Depends(get_db)):
     ingredients_text = ", ".join(ingredients_list)
 
     # Use Gemini API to generate new dishes
-    model = genai.GenerativeModel("gemini-1.5-flash")
     prompt = f"""
     You are a recipe generator. Create 3 unique dishes using only these available ingredients: {ingredients_text}.
     
@@ -138,7 +184,7 @@ def generate_dishes(db: Session = Depends(get_db)):
     ]
     """
 
-    response = model.generate_content(prompt)
+    response = await call_gemini(prompt)  # ✅ Awaited, so the worker keeps serving other requests
 
     # Debug: Print raw response from Gemini
     raw_text = response.text
@@ -157,64 +203,91 @@ def generate_dishes(db: Session = Depends(get_db)):
 
 
     
-@app.post("/inventory/")
-def add_inventory(item: InventoryItemRequest, db: Session = Depends(get_db)):
-    # ✅ No need to convert Expiry_Date again
-    expiry_date = item.Expiry_Date
-
-    # ✅ Check if the same item exists with the same expiry date
-    existing_item = (
-        db.query(models.InventoryItem)
-        .filter(
-            models.InventoryItem.Item_Name == item.Item_Name,
-            models.InventoryItem.Expiry_Date == expiry_date
-        )
-        .first()
-    )
-
-    if existing_item:
-        # ✅ If same expiry date → Update quantity
-        existing_item.Quantity += item.Quantity
-        existing_item.Price_per_Unit = item.Price_per_Unit  # Optional: Update price
-        existing_item.Storage_Location = item.Storage_Location  # Optional update
-        db.commit()
-        return {"message": f"Updated existing inventory for '{item.Item_Name}', new quantity: {existing_item.Quantity}, expiry: {expiry_date}"}
-    
-    # ✅ If expiry date is different → Insert as a new entry
-    new_item = models.InventoryItem(
-        Item_Name=item.Item_Name,
-        Category=item.Category,
-        Quantity=item.Quantity,
-        Unit=item.Unit,
-        Price_per_Unit=item.Price_per_Unit,
-        Expiry_Date=expiry_date,  # ✅ No conversion needed
-        Storage_Location=item.Storage_Location,
-        Detected_By_AI=item.Detected_By_AI,
-        Confidence_Score=item.Confidence_Score
-    )
+def receive_inventory(db, item):
+    # ✅ One upsert on (Item_Name, Expiry_Date): concurrent receipts of the same lot add up instead of colliding
+    [(lot, inserted)] = ledger.receive(db, [item.model_dump()])
+    if inserted:
+        return f"New inventory item '{item.Item_Name}' added with expiry {item.Expiry_Date}!"
+    return f"Updated existing inventory for '{item.Item_Name}', new quantity: {lot['Quantity']}, expiry: {item.Expiry_Date}"
 
-    db.add(new_item)
-    db.commit()
-    return {"message": f"New inventory item '{item.Item_Name}' added with expiry {expiry_date}!"}
+@app.post("/inventory/")
+async def add_inventory(item: InventoryItemRequest, db: AsyncSession = Depends(get_async_db)):
+    message = await db.run_sync(receive_inventory, item)
+    await db.commit()
+    return {"message": message}
+
+# ✅ Uploaded file as (seekable file, format, name): raw body or multipart "file" field
+async def read_upload(request: Request, requested: str | None, formats):
+    import inventory_bulk
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="⚠ Upload the data as a 'file' field.")
+        fmt = inventory_bulk.detect_format(upload.content_type, upload.filename, requested)
+        source, name = upload.file, upload.filename
+    else:
+        fmt = inventory_bulk.detect_format(content_type, requested=requested)
+        source, name = await inventory_bulk.spool(request.stream()), None
+    if fmt not in formats:
+        source.close()
+        raise HTTPException(status_code=415, detail=f"⚠ Send one of: {', '.join(formats)}.")
+    return source, fmt, name
+
+# ✅ Bulk intake: JSON array, CSV or Parquet (raw body or multipart "file"), one upsert per chunk
+@app.post("/inventory/bulk")
+async def add_inventory_bulk(request: Request, format: str | None = None):
+    import inventory_bulk
+
+    source, fmt, _name = await read_upload(request, format, inventory_bulk.FORMATS)
+    try:
+        return await run_in_threadpool(inventory_bulk.ingest, source, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"⚠ {e}")
+    finally:
+        source.close()
 
-# ✅ Get All Inventory Items
+# ✅ Get All Inventory Items (keyset pages, ?fields= projection, streamed JSON/NDJSON, ETag/304)
 @app.get("/inventory/")
-def get_inventory(db: Session = Depends(get_db)):
-    return db.query(models.InventoryItem).all()
+async def get_inventory(
+    request: Request,
+    fields: str | None = None,
+    limit: int | None = Query(default=None, gt=0, le=listing.MAX_PAGE_SIZE),
+    after: str | None = None,
+    order: str = "id",
+    format: str = "json",
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    await caching.refresh_async(db)
+    etag = caching.etag([models.InventoryItem.__tablename__], request.url.query)
+    if caching.not_modified(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response = await listing.respond_async(db, models.InventoryItem, fields, limit, after, order, format)
+    response.headers["ETag"] = etag
+    return response
 
 @app.put("/inventory/{item_id}")
 def update_inventory(item_id: int, item: InventoryItem, db: Session = Depends(get_db)):
     inventory_item = db.query(models.InventoryItem).filter(models.InventoryItem.Item_ID == item_id).first()
     if not inventory_item:
         return JSONResponse(status_code=404, content={"message": "Item not found"})
+    try:
+        expiry_date = ledger.naive_utc(item.Expiry_Date)  # ✅ The DateTime column (and its change-feed flush) needs a datetime
+    except ValueError:
+        raise HTTPException(status_code=422, detail="⚠ Expiry_Date must be an ISO 8601 date.")
 
+    ledger.record(db, inventory_item, ledger.ADJUSTMENT, item.Quantity - (inventory_item.Quantity or 0), reference="manual-edit")
     inventory_item.Item_Name = item.Item_Name
     inventory_item.Category = item.Category
     inventory_item.Quantity = item.Quantity
     inventory_item.Unit = item.Unit
     inventory_item.Price_per_Unit = item.Price_per_Unit
-    inventory_item.Expiry_Date = item.Expiry_Date
+    inventory_item.Expiry_Date = expiry_date
     inventory_item.Storage_Location = item.Storage_Location
+    changes.updated(db, inventory_item)
     
     db.commit()
     return JSONResponse(status_code=200, content={"message": f"Inventory item '{item.Item_Name}' updated successfully!"})
@@ -225,15 +298,64 @@ def delete_inventory(item_id: int, db: Session = Depends(get_db)):
     if not inventory_item:
         raise HTTPException(status_code=404, detail="Item not found")
     
+    ledger.record(db, inventory_item, ledger.ADJUSTMENT, -(inventory_item.Quantity or 0), reference="deleted")
+    changes.deleted(db, inventory_item)
     db.delete(inventory_item)
     db.commit()
     return {"message": f"Inventory item '{inventory_item.Item_Name}' deleted successfully!"}
 
 
+# ✅ Record spoiled / discarded stock against a lot
+@app.post("/inventory/{item_id}/waste")
+def record_waste(item_id: int, waste: WasteRequest, db: Session = Depends(get_db)):
+    inventory_item = (
+        db.query(models.InventoryItem)
+        .filter(models.InventoryItem.Item_ID == item_id)
+        .with_for_update()
+        .first()
+    )
+    if not inventory_item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if waste.Quantity > (inventory_item.Quantity or 0):
+        raise HTTPException(status_code=400, detail=f"⚠ Only {inventory_item.Quantity} {inventory_item.Unit} left in this lot.")
+
+    inventory_item.Quantity -= waste.Quantity
+    ledger.record(db, inventory_item, ledger.WASTE, -waste.Quantity, reference=waste.Reason)
+    changes.updated(db, inventory_item)
+    db.commit()
+    return {"message": f"Recorded {waste.Quantity} {inventory_item.Unit} of '{inventory_item.Item_Name}' as waste", "remaining": inventory_item.Quantity}
+
+# ✅ Stock movement history (append-only ledger)
+@app.get("/inventory/movements")
+def get_stock_movements(
+    item_id: int | None = None,
+    after_id: int = 0,
+    limit: int = Query(default=100, gt=0, le=1000),
+    db: Session = Depends(get_db),
+):
+    query = db.query(models.StockMovement).filter(models.StockMovement.Movement_ID > after_id)
+    if item_id is not None:
+        query = query.filter(models.StockMovement.Item_ID == item_id)
+    return query.order_by(models.StockMovement.Movement_ID).limit(limit).all()
+
+# ✅ Stock per lot now or at any past timestamp (latest snapshot + movement tail)
+@app.get("/inventory/stock")
+def get_stock(at: datetime | None = None, item_name: str | None = None, db: Session = Depends(get_db)):
+    at = at or datetime.now()
+    return {"at": at, "lots": ledger.stock_at(db, at, item_name)}
+
+# ✅ Fold the movement tail of every lot into a new snapshot
+@app.post("/inventory/snapshots")
+def take_stock_snapshots(db: Session = Depends(get_db)):
+    written = ledger.take_snapshots(db)
+    db.commit()
+    return {"message": f"{written} stock snapshot(s) written"}
+
+
 # ✅ Add Daily Activity Entry
 @app.post("/daily-activity/")
 def add_daily_activity(activity: DailyActivityRequest, db: Session = Depends(get_db)):
-    date_time = datetime.strptime(activity.Date_Time, "%Y-%m-%d %H:%M")
+    date_time = activity.Date_Time  # ✅ Already parsed by Pydantic
     new_activity = models.DailyActivity(
         Date_Time=date_time,
         Item_Name=activity.Item_Name,
@@ -244,104 +366,153 @@ def add_daily_activity(activity: DailyActivityRequest, db: Session = Depends(get
         Day_Type=activity.Day_Type
     )
     db.add(new_activity)
+    rollups.record(db, [new_activity])
     db.commit()
     return {"message": "Daily activity recorded successfully!", "timestamp": date_time}
 
-def extract_numeric_value(quantity_str):
-    """Extracts the numeric part of a quantity string (e.g., '100g' -> 100.0)."""
-    match = re.match(r"([\d.]+)", str(quantity_str))  # Ensure it's a string before regex
-    return float(match.group(1)) if match else None
-
 @app.post("/customer-order/")
-def add_customer_order(order: CustomerOrderRequest, db: Session = Depends(get_db)):
+async def add_customer_order(order: CustomerOrderRequest, db: AsyncSession = Depends(get_async_db)):
     date_time = order.Date_Time  # ✅ Already a datetime object, no need for strptime()
 
-    # ✅ Insert Order into `customer_order`
-    new_order = models.CustomerOrder(
-        Customer_ID=order.Customer_ID,
-        Date_Time=date_time,
-        Items_Ordered=order.Items_Ordered,
-        Total_Bill=order.Total_Bill,
-        Order_Status=order.Order_Status
-    )
-    db.add(new_order)
-
-    # ✅ Extract Daily Activity Details & Deduct Ingredients
-    for dish_name, quantity_ordered in order.Items_Ordered.items():
-        # Fetch recipe details
-        recipe = db.query(models.Recipe).filter(models.Recipe.Dish_Name == dish_name).first()
-        if not recipe:
-            return {"error": f"Recipe for '{dish_name}' not found"}
-
-        for ingredient, required_quantity in recipe.Ingredients.items():
-            numeric_required_quantity = extract_numeric_value(required_quantity)
-            if numeric_required_quantity is None:
-                return {"error": f"Invalid quantity format for ingredient '{ingredient}'"}
-
-            required_total = numeric_required_quantity * int(quantity_ordered)
-
-            # ✅ Fetch inventory items sorted by expiry date (FIFO)
-            inventory_items = (
-                db.query(models.InventoryItem)
-                .filter(models.InventoryItem.Item_Name == ingredient)
-                .order_by(models.InventoryItem.Expiry_Date)  # ✅ Oldest expiry first
-                .all()
-            )
-
-            if not inventory_items:
-                return {"error": f"Ingredient '{ingredient}' not found in inventory"}
-
-            remaining_needed = required_total  # Track how much still needs to be deducted
-
-            for inventory_item in inventory_items:
-                current_quantity = extract_numeric_value(inventory_item.Quantity)
-
-                if current_quantity is None:
-                    return {"error": f"Invalid inventory format for ingredient '{ingredient}'"}
-
-                if current_quantity >= remaining_needed:
-                    inventory_item.Quantity = current_quantity - remaining_needed
-                    remaining_needed = 0  # ✅ Fully deducted
-                    break  # Stop checking further stocks
-                else:
-                    remaining_needed -= current_quantity
-                    inventory_item.Quantity = 0  # ✅ Use up this stock
-
-            if remaining_needed > 0:
-                return {"error": f"Insufficient stock for ingredient '{ingredient}' (Needed: {required_total}, Available: {required_total - remaining_needed})"}
-
-        # ✅ Log Daily Activity
-        new_activity = models.DailyActivity(
-            Date_Time=date_time,
-            Item_Name=dish_name,
-            Quantity_Sold=quantity_ordered,
-            Revenue=order.Total_Bill,
-            Customer_Count=1,
-            Weather_Condition=None,
-            Day_Type=get_day_type(date_time)
+    # ✅ Recipes and lots are loaded in a constant number of queries, stock is deducted in memory
+    try:
+        await orders.transact_async(db, lambda session: orders.place_order(session, order))
+    except orders.OrderError as e:
+        return {"error": str(e)}  # ✅ Rolled back, nothing is half-deducted
+
+    return {"message": "Order placed, ingredients deducted using FIFO, and daily activity recorded successfully!", "timestamp": date_time}
+
+
+# ✅ Ingest a batch of POS orders in one transaction
+@app.post("/customer-order/bulk")
+def add_customer_orders_bulk(order_list: list[CustomerOrderRequest], db: Session = Depends(get_db)):
+    errors = orders.transact(db, lambda session: orders.place_orders(session, order_list))
+
+    results = [
+        {"index": index, "status": "error", "error": error} if error else {"index": index, "status": "placed"}
+        for index, error in enumerate(errors)
+    ]
+    placed = sum(1 for error in errors if error is None)
+    return {"placed": placed, "failed": len(errors) - placed, "results": results}
+
+
+# ✅ Hold stock for a cart until it is ordered or the hold expires
+@app.post("/reservations/")
+def create_reservation(reservation: ReservationRequest, db: Session = Depends(get_db)):
+    try:
+        cart_id, expires_at, held = orders.transact(
+            db,
+            lambda session: orders.reserve(session, reservation.Cart_ID, reservation.Items_Ordered, reservation.TTL_Seconds),
         )
-        db.add(new_activity)
+    except orders.OrderError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"Cart_ID": cart_id, "Expires_At": expires_at, "Held": held}
 
+@app.delete("/reservations/{cart_id}")
+def release_reservation(cart_id: str, db: Session = Depends(get_db)):
+    released = orders.release(db, cart_id)
     db.commit()
-    return {"message": "Order placed, ingredients deducted using FIFO, and daily activity recorded successfully!", "timestamp": date_time}
+    if not released:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return {"message": f"Reservation '{cart_id}' released"}
+
+
+# ✅ Change feed: everything after a version, as JSON or a resumable SSE stream
+@app.get("/changes/")
+def get_changes(since: int = Query(default=0, ge=0), db: Session = Depends(get_db)):
+    events, reset = changes.read(db, since)
+    version = events[-1]["version"] if events else since
+    if reset:
+        version = changes.latest(db)
+    return {"version": version, "reset": reset, "changes": events}
+
+@app.get("/changes/stream")
+async def stream_changes(
+    request: Request,
+    since: int | None = Query(default=None, ge=0),
+    last_event_id: str | None = Header(default=None),
+):
+    # ✅ Browsers resume from Last-Event-ID on reconnect; new clients start from ?since= (default: now)
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = await run_in_threadpool(changes.current_version)  # ✅ Sync session off the event loop
+    return StreamingResponse(
+        changes.stream(since, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ✅ Historical POS exports (CSV/Parquet), streamed in chunks; re-sending a file resumes it
+async def import_history(request: Request, kind: str, format: str | None, activity: bool = True):
+    import history_import
 
+    source, fmt, name = await read_upload(request, format, history_import.FORMATS)
+    try:
+        summary = await run_in_threadpool(history_import.run, source, kind, fmt, name, with_activity=activity)
+    finally:
+        source.close()
+    if summary["Status"] != "done":
+        return JSONResponse(status_code=500, content=summary)
+    return summary
 
+@app.post("/daily-activity/import")
+async def import_daily_activity(request: Request, format: str | None = None):
+    return await import_history(request, "daily-activity", format)
 
-def get_day_type(date_time):
-    """Helper function to determine if the day is a weekday, weekend, or holiday"""
-    weekday = date_time.weekday()
-    return "Weekend" if weekday >= 5 else "Weekday"
+@app.post("/customer-order/import")
+async def import_customer_orders(request: Request, format: str | None = None, activity: bool = True):
+    return await import_history(request, "customer-order", format, activity)
 
 
-# ✅ Get All Customer Orders
+# ✅ Get All Customer Orders (keyset pages, ?fields= projection, streamed JSON/NDJSON)
 @app.get("/customer-order/")
-def get_customer_orders(db: Session = Depends(get_db)):
-    return db.query(models.CustomerOrder).all()
-
-# ✅ Get All Daily Activities
+async def get_customer_orders(
+    fields: str | None = None,
+    limit: int | None = Query(default=None, gt=0, le=listing.MAX_PAGE_SIZE),
+    after: str | None = None,
+    order: str = "id",
+    format: str = "json",
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await listing.respond_async(db, models.CustomerOrder, fields, limit, after, order, format)
+
+# ✅ Get All Daily Activities (keyset pages, ?fields= projection, streamed JSON/NDJSON)
 @app.get("/daily-activity/")
-def get_daily_activity(db: Session = Depends(get_db)):
-    return db.query(models.DailyActivity).all()
+def get_daily_activity(
+    fields: str | None = None,
+    limit: int | None = Query(default=None, gt=0, le=listing.MAX_PAGE_SIZE),
+    after: str | None = None,
+    order: str = "id",
+    format: str = "json",
+    db: Session = Depends(get_db),
+):
+    return listing.respond(db, models.DailyActivity, fields, limit, after, order, format)
+
+# ✅ Per item per day sales rollups (for dashboards and analytics)
+@app.get("/daily-sales/")
+def get_daily_sales(
+    start: date | None = None,
+    end: date | None = None,
+    item_name: str | None = None,
+    db: Session = Depends(get_db),
+):
+    query = db.query(models.DailySales)
+    if start is not None:
+        query = query.filter(models.DailySales.Date >= start)
+    if end is not None:
+        query = query.filter(models.DailySales.Date <= end)
+    if item_name is not None:
+        query = query.filter(models.DailySales.Item_Name == item_name)
+    return query.order_by(models.DailySales.Date, models.DailySales.Item_Name).all()
+
+# ✅ Recompute rollups from daily_activity (after imports or manual fixes)
+@app.post("/daily-sales/rebuild")
+def rebuild_daily_sales(start: date | None = None, end: date | None = None, db: Session = Depends(get_db)):
+    written = rollups.rebuild(db, start, end)
+    db.commit()
+    return {"message": f"Rebuilt {written} daily sales row(s)"}
 
 # ✅ Add Recipe
 @app.post("/recipe/")
@@ -355,166 +526,133 @@ def add_recipe(recipe: RecipeRequest, db: Session = Depends(get_db)):
         price=recipe.price if recipe.price is not None else 0.0  # ✅ Default to 0.0
     )
     db.add(new_recipe)
+    try:
+        changes.inserted(db, new_recipe)
+    except IntegrityError:  # ✅ Dish names are unique (uq_recipe_dish_name)
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"⚠ Recipe '{recipe.Dish_Name}' already exists.")
+    ingredients.compile_recipes(db, [new_recipe])  # ✅ Parse quantities once, at write time
     db.commit()
     return {"message": "Recipe added successfully!"}
 
 
 # ✅ Get All Recipes
 @app.get("/recipe/")
-def get_recipes(db: Session = Depends(get_db)):
-    return db.query(models.Recipe).all()
-
-def extract_numeric_value(value):
-    """Ensure the value is a string before applying regex."""
-    value = str(value)  # Convert to string before regex
-    match = re.match(r"(\d+\.?\d*)", value)
-    return float(match.group(1)) if match else None
-
-from datetime import datetime, timedelta
+def get_recipes(
+    request: Request,
+    fields: str | None = None,
+    limit: int | None = Query(default=None, gt=0, le=listing.MAX_PAGE_SIZE),
+    after: str | None = None,
+    order: str = "id",
+    format: str = "json",
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    etag = caching.etag([models.Recipe.__tablename__], request.url.query)
+    if caching.not_modified(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response = listing.respond(db, models.Recipe, fields, limit, after, order, format)
+    response.headers["ETag"] = etag
+    return response
 
 @app.get("/menu/")
-def get_available_menu(db: Session = Depends(get_db)):
-    available_dishes = []
-
-    # ✅ Fetch all recipes
-    recipes = db.query(models.Recipe).all()
-    dish_expiry_mapping = []  # Store dishes with expiry date & pricing info
-
-    for recipe in recipes:
-        all_ingredients_available = True  # ✅ Can we make this dish?
-        earliest_expiry_date = None  # Track the earliest expiry date among ingredients
-        total_cost = 0  # Track total cost to make the dish
-
-        for ingredient, required_quantity in recipe.Ingredients.items():
-            numeric_required_quantity = extract_numeric_value(str(required_quantity))
-            if numeric_required_quantity is None:
-                all_ingredients_available = False
-                break  # Skip this dish if an ingredient has an invalid format
-
-            # ✅ Fetch inventory items sorted by expiry date (FIFO)
-            inventory_items = (
-                db.query(models.InventoryItem)
-                .filter(models.InventoryItem.Item_Name == ingredient)
-                .order_by(models.InventoryItem.Expiry_Date)  # ✅ Oldest expiry first
-                .all()
-            )
-
-            if not inventory_items:
-                all_ingredients_available = False
-                break  # Skip this dish if an ingredient is missing
-
-            remaining_needed = numeric_required_quantity  # Track needed quantity
-
-            for inventory_item in inventory_items:
-                current_quantity = extract_numeric_value(str(inventory_item.Quantity))
-                if current_quantity is None:
-                    all_ingredients_available = False
-                    break  # Skip if inventory data is invalid
-
-                # ✅ Track soonest expiring ingredient
-                if earliest_expiry_date is None or inventory_item.Expiry_Date < earliest_expiry_date:
-                    earliest_expiry_date = inventory_item.Expiry_Date  
-
-                # ✅ Proper Cost Calculation
-                if remaining_needed > 0:
-                    used_quantity = min(remaining_needed, current_quantity)  # Use available stock
-                    cost = (used_quantity * inventory_item.Price_per_Unit)  # Correct cost formula
-                    total_cost += cost
-                    remaining_needed -= used_quantity  # Deduct from needed amount
-
-                if remaining_needed == 0:
-                    break  # ✅ Fully satisfied, no need to check more inventory
-
-            if remaining_needed > 0:
-                all_ingredients_available = False
-                break  # Not enough stock to make this dish
-
-        if all_ingredients_available:
-            # ✅ Calculate profit margin based on expiry date
-            days_until_expiry = (earliest_expiry_date - datetime.now()).days if earliest_expiry_date else float("inf")
-            
-            if days_until_expiry <= 3:
-                profit_margin = 0.2  # 20% for expiry within 3 days
-            elif 4 <= days_until_expiry <= 5:
-                profit_margin = 0.25  # 25% for expiry within 4-5 days
-            else:
-                profit_margin = 0.3  # 30%+ for more than 5 days
-            
-            final_price = total_cost * (1 + profit_margin)  # Apply profit margin
-
-            dish_expiry_mapping.append({
-                "Dish_Name": recipe.Dish_Name,
-                "Earliest_Expiry": earliest_expiry_date.strftime("%Y-%m-%d") if earliest_expiry_date else None,
-                "Total_Cost": round(total_cost, 2),
-                "Final_Price": round(final_price, 2),
-                "Profit_Margin": f"{int(profit_margin * 100)}%"
-            })
-
-    # ✅ Sort dishes by **earliest expiring ingredient**
-    dish_expiry_mapping.sort(key=lambda x: x["Earliest_Expiry"] if x["Earliest_Expiry"] else datetime.max)
-
-    return {"menu": dish_expiry_mapping}
+async def get_available_menu(if_none_match: str | None = Header(default=None), db: AsyncSession = Depends(get_async_db)):
+    # ✅ Keyed by the inventory/recipe versions, so unchanged polls skip the database entirely
+    await caching.refresh_async(db)
+    key = caching.menu_key()
+    etag = caching.tag("menu", *key)
+    if caching.not_modified(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    body = caching.menu_hit(key)
+    if body is None:
+        # ✅ One query for recipes + one FIFO-ordered query for every referenced lot, then pricing off the event loop
+        inputs = await db.run_sync(menu_engine.load_inputs)
+        body = await run_in_threadpool(lambda: listing.dumps({"menu": menu_engine.compute_menu(*inputs)}))
+        caching.remember_menu(key, body)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+# ✅ How many portions of each dish current stock can cover
+@app.get("/menu/capacity")
+def get_menu_capacity(db: Session = Depends(get_db)):
+    return {"capacity": menu_engine.build_capacity(db)}
+
+
+# ✅ Per-item fit status and freshness of the forecast store
+@app.get("/forecast/status")
+def get_forecast_status(db: Session = Depends(get_db)):
+    return forecast_store.status(db)
+
+# ✅ Trigger a refit in the background, then poll it
+@app.post("/forecast/jobs")
+def create_forecast_job(force: bool = False):
+    return {"Job_ID": forecast_store.enqueue(force), "Status": "queued"}
+
+@app.get("/forecast/jobs/{job_id}")
+def get_forecast_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(models.ForecastJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# ✅ Ingredient demand, FIFO stock with expiries, shortfalls and reorder quantities
+@app.get("/forecast/ingredients/{n_days}")
+def forecast_ingredients(n_days: int, mode: str = "fast", db: Session = Depends(get_db)):
+    import purchasing
 
+    if n_days <= 0:
+        raise HTTPException(status_code=400, detail="⚠ Number of days must be positive.")
+    if mode not in purchasing.MODES:
+        raise HTTPException(status_code=400, detail=f"⚠ Mode must be one of: {', '.join(purchasing.MODES)}.")
+    projection = purchasing.project(db, n_days, mode=mode)
+    if projection is None:
+        raise HTTPException(status_code=409, detail="⚠ Stored forecasts don't cover this horizon yet.")
+    return projection
 
 @app.get("/forecast/{n_days}")
-def forecast_sales(n_days: int, db: Session = Depends(get_db)):
+def forecast_sales(n_days: int, response: Response, mode: str = "prophet", db: Session = Depends(get_db)):
     if n_days <= 0:
         raise HTTPException(status_code=400, detail="⚠ Number of days must be positive.")
-    
-    data_records = db.query(DailyActivity).all()
-    if not data_records:
-        raise HTTPException(status_code=400, detail="⚠ No data available for forecasting.")
-    
-    # Convert stored records to DataFrame
-    df = pd.DataFrame([{
-        'Date_Time': record.Date_Time,
-        'Item_Name': record.Item_Name,
-        'Quantity_Sold': record.Quantity_Sold,
-        'Revenue': record.Revenue,
-        'Customer_Count': record.Customer_Count,
-        'Weather_Condition': record.Weather_Condition,
-        'Day_Type': record.Day_Type
-    } for record in data_records])
-    
-    df['Date_Time'] = pd.to_datetime(df['Date_Time'])
-    df['date'] = df['Date_Time'].dt.date
-    df['day_of_week'] = df['Date_Time'].dt.weekday
-    df['is_weekend'] = df['day_of_week'].apply(lambda x: 1 if x >= 5 else 0)
-    
-    items = df['Item_Name'].unique()
-    all_predictions = []
+    if mode not in ("prophet", "fast", "xgboost"):
+        raise HTTPException(status_code=400, detail="⚠ Mode must be 'prophet', 'fast' or 'xgboost'.")
     
     today = datetime.now().date()
-    
-    for item in items:
-        item_data = df[df['Item_Name'] == item].copy()
-        
-        if len(item_data) < 50:
-            continue
-        
-        daily_data = item_data.groupby('date').agg({
-            'Quantity_Sold': 'sum',
-            'Revenue': 'mean',
-            'is_weekend': 'max',
-        }).reset_index()
-        
-        daily_data.rename(columns={'date': 'ds', 'Quantity_Sold': 'y'}, inplace=True)
-        daily_data['weekend'] = daily_data['is_weekend']
-        
-        model = Prophet(daily_seasonality=True, weekly_seasonality=True)
-        model.add_regressor('weekend')
-        model.fit(daily_data)
-        
-        future_dates = pd.date_range(start=today, periods=n_days)
-        future = pd.DataFrame({'ds': future_dates})
-        future['weekend'] = future['ds'].dt.dayofweek.apply(lambda x: 1 if x >= 5 else 0)
-        
-        forecast = model.predict(future)
-        
-        item_forecast = forecast[['ds', 'yhat']].copy()
-        item_forecast['Item_Name'] = item
-        item_forecast['yhat'] = item_forecast['yhat'].round().astype(int)
-        all_predictions.append(item_forecast)
+
+    # ✅ Vectorized Holt-Winters, or one global XGBoost model, over every item at once
+    if mode in ("fast", "xgboost"):
+        if mode == "fast":
+            import fast_forecast as forecaster
+        else:
+            import xgb_forecast as forecaster
+        records = forecaster.forecast(db, n_days, today)
+        if not records:
+            raise HTTPException(status_code=400, detail="⚠ No data available for forecasting.")
+        response.headers["X-Forecast-Source"] = mode
+        return records
+
+    # ✅ Serve precomputed predictions when the store covers the request
+    stored = forecast_store.read(db, n_days, today)
+    if stored is not None:
+        records, fitted_at = stored
+        response.headers["X-Forecast-Source"] = "store"
+        response.headers["X-Forecast-Fitted-At"] = fitted_at.isoformat()
+        response.headers["X-Forecast-Age-Seconds"] = str(int((datetime.now() - fitted_at).total_seconds()))
+        return records
+
+    # ✅ Compact per item per day rollups instead of every DailyActivity row
+    sales = rollups.sales_frame(db)
+    if sales.empty:
+        raise HTTPException(status_code=400, detail="⚠ No data available for forecasting.")
+
+    # ✅ Per-item Prophet fits run in parallel in a process pool
+    import forecasting
+    import pandas as pd
+
+    all_predictions, failures = forecasting.forecast_items(sales, n_days, today)
+    response.headers["X-Forecast-Source"] = "live"
+    if failures:
+        response.headers["X-Forecast-Failed-Items"] = str(len(failures))
     
     if not all_predictions:
         raise HTTPException(status_code=400, detail="⚠ Not enough data for forecasting.")
@@ -526,7 +664,10 @@ def forecast_sales(n_days: int, db: Session = Depends(get_db)):
 
 @app.get("/inventory/ai-analysis")
 def ai_inventory_analysis(db: Session = Depends(get_db)):
-    inventory_items = db.query(InventoryItem).all()
+    import numpy as np
+    import pandas as pd
+
+    inventory_items = db.query(models.InventoryItem).all()  # ✅ The ORM model; InventoryItem here is the request schema
     if not inventory_items:
         raise HTTPException(status_code=400, detail="⚠ No inventory data available.")
     
@@ -553,41 +694,89 @@ class ImageRequest(BaseModel):
 # IMAGE PROCESSING ENDPOINT
 # ===========================
 
-@app.post("/analyze-food")
-async def analyze_food(file: UploadFile = File(...)):
+# ✅ (food items, how the cache matched) for one image; shared by /analyze-food and /analyze-video
+async def identify_food(contents):
+    # ✅ Unchanged frames are answered from memory; everything else is checked by perceptual hash first
+    sha = vision_cache.digest(contents)
+    food_map = vision_cache.recall(sha)
+    how, perceptual = "exact", None
+    if food_map is None:
+        food_map, how, perceptual = await run_in_threadpool(vision_cache.lookup, contents, sha)
+    if food_map is not None:
+        return food_map, how
+
+    # ✅ Gemini gets a downscaled JPEG, not the full-resolution photo
     try:
-        # Read and open the uploaded image
-        contents = await file.read()
-        img = Image.open(io.BytesIO(contents))
-
-        # Identify food items
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response_food = model.generate_content([
-            "Identify all food items in the image and return them in a structured format: "
-            "each item followed by its quantity, separated by commas. "
-            "Do not include any extra text, descriptions, or explanations. Example format: '2 apples, 150g rice, 1 sandwich'.",
-            img
-        ])
-
-        if not response_food.text:
-            raise HTTPException(status_code=500, detail="Failed to identify food items")
+        jpeg, _stats = await run_in_threadpool(image_prep.prepare, contents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"⚠ {e}")
+
+    # Identify food items
+    response_food = await call_gemini([
+        "Identify all food items in the image and return them in a structured format: "
+        "each item followed by its quantity, separated by commas. "
+        "Do not include any extra text, descriptions, or explanations. Example format: '2 apples, 150g rice, 1 sandwich'.",
+        {"mime_type": "image/jpeg", "data": jpeg}
+    ])
+
+    if not response_food.text:
+        raise HTTPException(status_code=500, detail="Failed to identify food items")
+    
+    # Extract only valid food items and quantities
+    extracted_items = re.findall(r"(\d+\s*[a-zA-Z]*\s+[a-zA-Z]+)", response_food.text)
+    food_map = {}
+
+    for item in extracted_items:
+        match = re.match(r"(\d+\s*[a-zA-Z]*)\s+(.+)", item.strip())
+        if match:
+            quantity = match.group(1)
+            name = match.group(2)
+        else:
+            quantity = "1"
+            name = item.strip()
         
-        # Extract only valid food items and quantities
-        extracted_items = re.findall(r"(\d+\s*[a-zA-Z]*\s+[a-zA-Z]+)", response_food.text)
-        food_map = {}
-
-        for item in extracted_items:
-            match = re.match(r"(\d+\s*[a-zA-Z]*)\s+(.+)", item.strip())
-            if match:
-                quantity = match.group(1)
-                name = match.group(2)
-            else:
-                quantity = "1"
-                name = item.strip()
-            
-            food_map[name] = quantity
+        food_map[name] = quantity
+
+    await run_in_threadpool(vision_cache.store, contents, food_map, sha, perceptual)
+    return food_map, how
 
+@app.post("/analyze-food")
+async def analyze_food(response: Response, file: UploadFile = File(...)):
+    try:
+        # Read the uploaded image (up to the size limit)
+        try:
+            contents = await image_prep.read_limited(file)
+        except image_prep.ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=f"⚠ {e}")
+        food_map, how = await identify_food(contents)
+        response.headers["X-Vision-Cache"] = how
         return {"food_items": food_map}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Stock from a video: only scene changes are analyzed, decoding and analysis run in separate threads
+@app.post("/analyze-video")
+async def analyze_video(
+    file: UploadFile = File(...),
+    method: str = video_stock.VIDEO_SCENE_METHOD,
+    threshold: float = Query(default=video_stock.VIDEO_SCENE_THRESHOLD, ge=0.0, le=1.0),
+):
+    loop = asyncio.get_running_loop()
+
+    def analyze(jpeg):
+        food_map, how = asyncio.run_coroutine_threadsafe(identify_food(jpeg), loop).result()
+        return food_map, how != "miss"
+
+    # ✅ OpenCV reads from a path, so the upload is copied to a temporary file first
+    suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+    with tempfile.NamedTemporaryFile(suffix=suffix) as video:
+        await run_in_threadpool(shutil.copyfileobj, file.file, video)
+        video.flush()
+        try:
+            detector = video_stock.SceneDetector(method, threshold)
+            return await run_in_threadpool(video_stock.track, video.name, analyze, detector)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"⚠ {e}")
@@ -0,0 +1,236 @@
+"""Set-based menu availability and capacity engine used by GET /menu/."""
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+import ingredients
+import models
+import units
+
+
+def load_lots(db, base_units):
+    """Fetch every lot for the ingredients in `base_units` in one query, grouped in FIFO order.
+
+    Quantities and prices are converted to each ingredient's base unit.
+    """
+    lots = defaultdict(list)
+    if not base_units:
+        return lots
+
+    rows = (
+        db.query(
+            models.InventoryItem.Item_Name,
+            models.InventoryItem.Quantity,
+            models.InventoryItem.Unit,
+            models.InventoryItem.Price_per_Unit,
+            models.InventoryItem.Expiry_Date,
+        )
+        .filter(models.InventoryItem.Item_Name.in_(sorted(base_units)))
+        .order_by(
+            models.InventoryItem.Item_Name,
+            models.InventoryItem.Expiry_Date,  # ✅ Oldest expiry first
+            models.InventoryItem.Item_ID,
+        )
+        .all()
+    )
+    for name, quantity, unit, price, expiry in rows:
+        factor = units.conversion_factor(unit, base_units[name])
+        lots[name].append((
+            quantity * factor if quantity is not None else None,
+            (price or 0.0) / factor,
+            expiry,
+        ))
+    return lots
+
+
+def profit_margin_for(days_until_expiry):
+    """Pick the profit margin for a dish based on its soonest expiring ingredient."""
+    if days_until_expiry <= 3:
+        return 0.2  # 20% for expiry within 3 days
+    if 4 <= days_until_expiry <= 5:
+        return 0.25  # 25% for expiry within 4-5 days
+    return 0.3  # 30%+ for more than 5 days
+
+
+def price_recipe(requirements, lots):
+    """Walk FIFO lots for one portion of a recipe given its pre-parsed requirements.
+
+    Returns (total_cost, earliest_expiry), or None when the dish can't be made.
+    """
+    earliest_expiry_date = None
+    total_cost = 0
+
+    for ingredient, remaining_needed in requirements:
+        if remaining_needed is None:
+            return None  # Invalid quantity format
+
+        ingredient_lots = lots.get(ingredient)
+        if not ingredient_lots:
+            return None  # Ingredient missing from inventory
+
+        for current_quantity, price, expiry in ingredient_lots:
+            if current_quantity is None or current_quantity < 0:
+                return None  # Invalid inventory data
+
+            if expiry is not None and (earliest_expiry_date is None or expiry < earliest_expiry_date):
+                earliest_expiry_date = expiry
+
+            if remaining_needed > 0:
+                used_quantity = min(remaining_needed, current_quantity)
+                total_cost += used_quantity * price
+                remaining_needed -= used_quantity
+
+            if remaining_needed == 0:
+                break
+
+        if remaining_needed > 0:
+            return None  # Not enough stock
+
+    return total_cost, earliest_expiry_date
+
+
+def compute_menu(recipes, requirements, lots, now=None):
+    """Price every recipe against pre-loaded lots in a single pass."""
+    now = now or datetime.now()
+    dish_expiry_mapping = []
+
+    for recipe in recipes:
+        priced = price_recipe(requirements[recipe.Recipe_ID], lots)
+        if priced is None:
+            continue
+
+        total_cost, earliest_expiry_date = priced
+        days_until_expiry = (earliest_expiry_date - now).days if earliest_expiry_date else float("inf")
+        profit_margin = profit_margin_for(days_until_expiry)
+        final_price = total_cost * (1 + profit_margin)
+
+        dish_expiry_mapping.append({
+            "Dish_Name": recipe.Dish_Name,
+            "Earliest_Expiry": earliest_expiry_date.strftime("%Y-%m-%d") if earliest_expiry_date else None,
+            "Total_Cost": round(total_cost, 2),
+            "Final_Price": round(final_price, 2),
+            "Profit_Margin": f"{int(profit_margin * 100)}%"
+        })
+
+    # ✅ Sort dishes by **earliest expiring ingredient**
+    dish_expiry_mapping.sort(key=lambda x: x["Earliest_Expiry"] or "9999-12-31")
+    return dish_expiry_mapping
+
+
+def load_inputs(db):
+    """(recipes, requirements, lots) for the menu and capacity engines, in three queries."""
+    recipes = db.query(models.Recipe).all()
+    requirements, base_units = ingredients.requirements_for(db, recipes)
+    return recipes, requirements, load_lots(db, base_units)
+
+
+def build_menu(db, now=None):
+    """Compute the available menu with a constant number of queries (recipes, requirements, lots)."""
+    return compute_menu(*load_inputs(db), now)
+
+
+def compile_requirements(recipes, requirements):
+    """Compile pre-parsed requirements into a sparse (CSR) recipe x ingredient matrix.
+
+    Returns (dish_names, ingredient_names, indptr, indices, data, invalid) where
+    `invalid` flags recipes with an unparseable quantity.
+    """
+    dish_names = [recipe.Dish_Name for recipe in recipes]
+    ingredient_names = sorted({name for recipe in recipes for name, _ in requirements[recipe.Recipe_ID]})
+    column = {name: j for j, name in enumerate(ingredient_names)}
+
+    indptr = [0]
+    indices = []
+    data = []
+    invalid = np.zeros(len(recipes), dtype=bool)
+
+    for i, recipe in enumerate(recipes):
+        for ingredient, numeric_required_quantity in requirements[recipe.Recipe_ID]:
+            if numeric_required_quantity is None:
+                invalid[i] = True
+            elif numeric_required_quantity > 0:
+                indices.append(column[ingredient])
+                data.append(numeric_required_quantity)
+        indptr.append(len(indices))
+
+    return (
+        dish_names,
+        ingredient_names,
+        np.asarray(indptr, dtype=np.int64),
+        np.asarray(indices, dtype=np.int64),
+        np.asarray(data, dtype=float),
+        invalid,
+    )
+
+
+def compile_stock(lots, ingredient_names):
+    """Flatten FIFO lots into a stock vector plus cumulative quantity/cost curves.
+
+    Lots of every ingredient are laid end to end, so `cum_qty` / `cum_cost` are
+    one monotonic curve and `base_qty[j]` is where ingredient j starts on it.
+    """
+    quantities = []
+    prices = []
+    counts = np.zeros(len(ingredient_names), dtype=np.int64)
+
+    for j, name in enumerate(ingredient_names):
+        for quantity, price, _expiry in lots.get(name, ()):
+            quantities.append(max(quantity or 0.0, 0.0))
+            prices.append(price)
+        counts[j] = len(lots.get(name, ()))
+
+    quantities = np.asarray(quantities, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+
+    cum_qty = np.concatenate(([0.0], np.cumsum(quantities)))
+    cum_cost = np.concatenate(([0.0], np.cumsum(quantities * prices)))
+    lot_start = np.concatenate(([0], np.cumsum(counts)))
+    stock = cum_qty[lot_start[1:]] - cum_qty[lot_start[:-1]]
+    return stock, cum_qty, cum_cost, cum_qty[lot_start[:-1]], cum_cost[lot_start[:-1]]
+
+
+def compute_capacity(recipes, requirements, lots):
+    """Max portions, limiting ingredient and FIFO cost per portion for every recipe in one batched pass."""
+    dish_names, ingredient_names, indptr, indices, data, invalid = compile_requirements(recipes, requirements)
+    stock, cum_qty, cum_cost, base_qty, base_cost = compile_stock(lots, ingredient_names)
+
+    n_recipes = len(dish_names)
+    row_ids = np.repeat(np.arange(n_recipes), np.diff(indptr))
+    non_empty = np.diff(indptr) > 0
+
+    # ✅ Portions each ingredient alone could cover, then the minimum per recipe row
+    ratios = np.floor(stock[indices] / data + 1e-9) if len(data) else np.zeros(0)
+    max_portions = np.zeros(n_recipes, dtype=np.int64)
+    if non_empty.any():
+        max_portions[non_empty] = np.minimum.reduceat(ratios, indptr[:-1][non_empty]).astype(np.int64)
+    max_portions[invalid] = 0
+
+    # ✅ Limiting ingredient = smallest ratio in each row
+    order = np.lexsort((ratios, row_ids))
+    limiting = np.full(n_recipes, -1, dtype=np.int64)
+    limiting[non_empty] = indices[order[indptr[:-1][non_empty]]]
+
+    # ✅ FIFO cost of one portion: read each requirement off its ingredient's cumulative cost curve
+    if len(data):
+        targets = base_qty[indices] + np.minimum(data, stock[indices])
+        entry_costs = np.interp(targets, cum_qty, cum_cost) - base_cost[indices]
+    else:
+        entry_costs = np.zeros(0)
+    cost_per_portion = np.bincount(row_ids, weights=entry_costs, minlength=n_recipes)
+
+    capacity = []
+    for i, dish_name in enumerate(dish_names):
+        portions = int(max_portions[i])
+        capacity.append({
+            "Dish_Name": dish_name,
+            "Max_Portions": portions,
+            "Limiting_Ingredient": ingredient_names[limiting[i]] if limiting[i] >= 0 else None,
+            "Cost_Per_Portion": round(float(cost_per_portion[i]), 2) if portions > 0 else None,
+        })
+    return capacity
+
+
+def build_capacity(db):
+    """Compute dish capacity with the same three queries as `build_menu`."""
+    return compute_capacity(*load_inputs(db))
@@ -0,0 +1,140 @@
+"""Schema and data migrations. Every step is idempotent; run on each deploy:
+
+    python migrate.py
+"""
+from sqlalchemy import func, inspect, text
+
+import ingredients
+import ledger
+import models
+import rollups
+from database import SessionLocal, engine
+
+
+def create_tables():
+    """Create any missing tables."""
+    models.Base.metadata.create_all(bind=engine)
+
+
+def add_missing_columns():
+    """Add columns that were added to models after their table was created."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in models.Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+                not_null = " NOT NULL" if not column.nullable and default else ""
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}{default}{not_null}'))
+                print(f"   added {table.name}.{column.name}")
+
+
+def backfill_recipe_ingredients():
+    """Compile Recipe.Ingredients JSON into recipe_ingredient rows for existing recipes."""
+    with SessionLocal() as db:
+        compiled = ingredients.compile_missing(db)
+        db.commit()
+    print(f"   compiled {compiled} recipe(s)")
+
+
+def seed_stock_ledger():
+    """Record opening balances for inventory lots that predate the stock movement ledger."""
+    with SessionLocal() as db:
+        seeded = ledger.seed_opening_balances(db)
+        db.commit()
+    print(f"   seeded {seeded} lot(s)")
+
+
+def build_daily_sales():
+    """Build daily_sales rollups from daily_activity when the rollup table is still empty."""
+    with SessionLocal() as db:
+        if db.query(models.DailySales).first() is not None:
+            print("   already built")
+            return
+        written = rollups.rebuild(db)
+        db.commit()
+    print(f"   wrote {written} rollup row(s)")
+
+
+def merge_duplicate_lots():
+    """Merge inventory lots sharing (Item_Name, Expiry_Date) into the oldest one, through the ledger."""
+    with SessionLocal() as db:
+        duplicates = (
+            db.query(models.InventoryItem.Item_Name, models.InventoryItem.Expiry_Date)
+            .filter(models.InventoryItem.Expiry_Date.isnot(None))  # NULLs never conflict
+            .group_by(models.InventoryItem.Item_Name, models.InventoryItem.Expiry_Date)
+            .having(func.count(models.InventoryItem.Item_ID) > 1)
+            .all()
+        )
+        merged = 0
+        for item_name, expiry_date in duplicates:
+            keep, *rest = (
+                db.query(models.InventoryItem)
+                .filter(models.InventoryItem.Item_Name == item_name, models.InventoryItem.Expiry_Date == expiry_date)
+                .order_by(models.InventoryItem.Item_ID)
+                .all()
+            )
+            for lot in rest:
+                quantity = lot.Quantity or 0.0
+                ledger.record(db, lot, ledger.ADJUSTMENT, -quantity, reference=f"merged-into:{keep.Item_ID}")
+                ledger.record(db, keep, ledger.ADJUSTMENT, quantity, reference=f"merged-from:{lot.Item_ID}")
+                keep.Quantity = (keep.Quantity or 0.0) + quantity
+                db.delete(lot)
+                merged += 1
+        db.commit()
+    print(f"   merged {merged} lot(s)")
+
+
+def merge_duplicate_recipes():
+    """Keep the first recipe (lowest Recipe_ID) per Dish_Name, the one orders already used, and drop the rest."""
+    with SessionLocal() as db:
+        first = (
+            db.query(func.min(models.Recipe.Recipe_ID))
+            .group_by(models.Recipe.Dish_Name)
+            .scalar_subquery()
+        )
+        duplicates = [
+            recipe_id for (recipe_id,) in db.query(models.Recipe.Recipe_ID).filter(models.Recipe.Recipe_ID.notin_(first))
+        ]
+        if duplicates:
+            (
+                db.query(models.RecipeIngredient)
+                .filter(models.RecipeIngredient.Recipe_ID.in_(duplicates))
+                .delete(synchronize_session=False)
+            )
+            db.query(models.Recipe).filter(models.Recipe.Recipe_ID.in_(duplicates)).delete(synchronize_session=False)
+        db.commit()
+    print(f"   removed {len(duplicates)} duplicate recipe(s)")
+
+
+def create_indexes():
+    """Create indexes (including unique ones) that were added to models after their table was created."""
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+MIGRATIONS = [
+    create_tables,
+    add_missing_columns,
+    seed_stock_ledger,  # ✅ Before the merge, so merged lots' adjustments start from their opening balance
+    merge_duplicate_lots,
+    merge_duplicate_recipes,
+    create_indexes,
+    backfill_recipe_ingredients,
+    build_daily_sales,
+]
+
+
+def run():
+    for migration in MIGRATIONS:
+        print(f"➡ {migration.__name__}: {migration.__doc__}")
+        migration()
+    print("✅ Migrations complete")
+
+
+if __name__ == "__main__":
+    run()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, JSON, ForeignKey, Index
 from database import Base
 
 # ✅ Inventory Model
@@ -15,6 +15,12 @@ class InventoryItem(Base):
     Storage_Location = Column(String)
     Detected_By_AI = Column(Boolean)
     Confidence_Score = Column(Float)
+    Version = Column(Integer, nullable=False, default=1, server_default="1")  # ✅ Optimistic lock
+
+    __mapper_args__ = {"version_id_col": Version}
+    __table_args__ = (
+        Index("uq_inventory_item_expiry", "Item_Name", "Expiry_Date", unique=True),  # ✅ One lot per expiry
+    )
 
 # ✅ Daily Activity Model
 class DailyActivity(Base):
@@ -29,6 +35,10 @@ class DailyActivity(Base):
     Weather_Condition = Column(String, nullable=True)
     Day_Type = Column(String, nullable=False)
 
+    __table_args__ = (
+        Index("ix_daily_activity_item_time", "Item_Name", "Date_Time"),  # ✅ Per-item history and high-water marks
+    )
+
 # ✅ Customer Order Model
 class CustomerOrder(Base):
     __tablename__ = "customer_order"
@@ -50,4 +60,130 @@ class Recipe(Base):
     Calories = Column(Float, nullable=False)
     Prep_Time = Column(Integer, nullable=False)
     Cooking_Time = Column(Integer, nullable=False)
-    price = Column(Float) 
+    price = Column(Float)
+
+    __table_args__ = (
+        Index("uq_recipe_dish_name", "Dish_Name", unique=True),  # ✅ Orders and menus look dishes up by name
+    )
+
+# ✅ Canonical Ingredient Model
+class Ingredient(Base):
+    __tablename__ = "ingredient"
+
+    Ingredient_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    Name = Column(String, nullable=False, unique=True)
+    Base_Unit = Column(String, nullable=False)  # g, ml, pcs, ...
+
+# ✅ Recipe Ingredient Model (pre-parsed Recipe.Ingredients)
+class RecipeIngredient(Base):
+    __tablename__ = "recipe_ingredient"
+
+    Recipe_ID = Column(Integer, ForeignKey("recipe.Recipe_ID", ondelete="CASCADE"), primary_key=True)
+    Ingredient_ID = Column(Integer, ForeignKey("ingredient.Ingredient_ID"), primary_key=True)
+    Quantity = Column(Float, nullable=True)  # In Ingredient.Base_Unit, NULL if unparseable
+
+# ✅ Stock Reservation Model (short-lived cart holds)
+class StockReservation(Base):
+    __tablename__ = "stock_reservation"
+
+    Reservation_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    Cart_ID = Column(String, nullable=False, index=True)
+    Item_Name = Column(String, nullable=False, index=True)
+    Quantity = Column(Float, nullable=False)  # In the ingredient's base unit
+    Expires_At = Column(DateTime, nullable=False, index=True)
+
+# ✅ Stock Movement Model (append-only inventory ledger)
+class StockMovement(Base):
+    __tablename__ = "stock_movement"
+
+    Movement_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    Item_ID = Column(Integer, nullable=False, index=True)  # Lot; no FK so history outlives deleted lots
+    Item_Name = Column(String, nullable=False, index=True)
+    Movement_Type = Column(String, nullable=False)  # receipt, sale, waste, adjustment
+    Quantity_Delta = Column(Float, nullable=False)  # In the lot's unit
+    Date_Time = Column(DateTime, nullable=False, index=True)
+    Reference = Column(String, nullable=True)  # e.g. "order:42"
+
+# ✅ Stock Snapshot Model (per-lot quantity as of a movement)
+class StockSnapshot(Base):
+    __tablename__ = "stock_snapshot"
+
+    Snapshot_ID = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    Item_ID = Column(Integer, nullable=False, index=True)
+    Item_Name = Column(String, nullable=False)
+    Quantity = Column(Float, nullable=False)
+    Movement_ID = Column(Integer, nullable=False)  # Last movement included
+    Date_Time = Column(DateTime, nullable=False, index=True)
+
+# ✅ Forecast Model (precomputed predictions served by /forecast/{n_days})
+class Forecast(Base):
+    __tablename__ = "forecast"
+
+    Item_Name = Column(String, primary_key=True)
+    Date = Column(DateTime, primary_key=True)
+    Predicted_Quantity = Column(Integer, nullable=False)
+    Fitted_At = Column(DateTime, nullable=False)
+
+# ✅ Forecast Fit Model (per-item high-water mark for incremental refits)
+class ForecastFit(Base):
+    __tablename__ = "forecast_fit"
+
+    Item_Name = Column(String, primary_key=True)
+    High_Water_Mark = Column(DateTime, nullable=True)  # Latest DailyActivity.Date_Time seen by the fit
+    Row_Count = Column(Integer, nullable=False, default=0)  # Catches back-dated rows below the mark
+    Fitted_At = Column(DateTime, nullable=False)
+    Status = Column(String, nullable=False)  # ok, failed, skipped
+    Error = Column(String, nullable=True)
+
+# ✅ Forecast Job Model (on-demand / scheduled refits)
+class ForecastJob(Base):
+    __tablename__ = "forecast_job"
+
+    Job_ID = Column(String, primary_key=True)
+    Status = Column(String, nullable=False)  # queued, running, done, failed
+    Force = Column(Boolean, nullable=False, default=False)
+    Requested_At = Column(DateTime, nullable=False)
+    Started_At = Column(DateTime, nullable=True)
+    Finished_At = Column(DateTime, nullable=True)
+    Items_Refitted = Column(Integer, nullable=True)
+    Items_Failed = Column(Integer, nullable=True)
+    Error = Column(String, nullable=True)
+
+# ✅ Daily Sales Model (per item per day rollup of DailyActivity)
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+
+    Item_Name = Column(String, primary_key=True)
+    Date = Column(Date, primary_key=True)
+    Quantity_Sold = Column(Integer, nullable=False, default=0)
+    Revenue = Column(Float, nullable=False, default=0.0)  # Sum over the day's rows
+    Customer_Count = Column(Integer, nullable=False, default=0)
+    Order_Lines = Column(Integer, nullable=False, default=0)  # DailyActivity rows folded in
+    Day_Type = Column(String, nullable=True)
+    Weather_Condition = Column(String, nullable=True)
+
+# ✅ Change Feed Model (one row per committed insert/update/delete, Version is the resume point)
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+
+    Version = Column(Integer, primary_key=True, autoincrement=True)
+    Table_Name = Column(String, nullable=False)
+    Operation = Column(String, nullable=False)  # insert, update, delete
+    Row_Key = Column(Integer, nullable=False)
+    Data = Column(JSON, nullable=True)  # Full row for inserts, changed columns for updates
+    Date_Time = Column(DateTime, nullable=False, index=True)
+
+# ✅ Historical Import Model (one row per imported file, Rows_Done is the resume point)
+class ImportJob(Base):
+    __tablename__ = "import_job"
+
+    Import_ID = Column(String, primary_key=True)  # Target table + content hash, so a re-run resumes
+    Table_Name = Column(String, nullable=False)
+    Source = Column(String, nullable=True)  # File name, for humans
+    Status = Column(String, nullable=False)  # running, done, failed
+    Rows_Done = Column(Integer, nullable=False, default=0)  # Input rows committed (imported or rejected)
+    Rows_Imported = Column(Integer, nullable=False, default=0)
+    Rows_Failed = Column(Integer, nullable=False, default=0)
+    Started_At = Column(DateTime, nullable=False)
+    Finished_At = Column(DateTime, nullable=True)
+    Error = Column(String, nullable=True)
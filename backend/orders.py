@@ -0,0 +1,355 @@
+"""Batched, single-transaction order placement for POST /customer-order/.
+
+Lots are locked with SELECT ... FOR UPDATE in FIFO order and carry an optimistic
+version column, so concurrent orders can't both deduct from the same stock.
+Carts can hold stock for a short while through the stock_reservation ledger.
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+
+import changes
+import ingredients
+import ledger
+import models
+import rollups
+import units
+
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "600"))
+ORDER_RETRIES = int(os.getenv("ORDER_RETRIES", "10"))
+ORDER_RETRY_BASE_SECONDS = float(os.getenv("ORDER_RETRY_BASE_SECONDS", "0.01"))
+ORDER_RETRY_MAX_SECONDS = float(os.getenv("ORDER_RETRY_MAX_SECONDS", "1"))  # Longer than a lock is held
+
+
+class OrderError(Exception):
+    """An order can't be placed (unknown dish, bad recipe data or insufficient stock)."""
+
+
+def get_day_type(date_time):
+    """Helper function to determine if the day is a weekday, weekend, or holiday"""
+    weekday = date_time.weekday()
+    return "Weekend" if weekday >= 5 else "Weekday"
+
+
+def load_recipes(db, dish_names):
+    """Fetch the recipe for every dish in one query (first recipe wins on duplicate names)."""
+    recipes = {}
+    if not dish_names:
+        return recipes
+    for recipe in (
+        db.query(models.Recipe)
+        .filter(models.Recipe.Dish_Name.in_(sorted(dish_names)))
+        .order_by(models.Recipe.Recipe_ID)
+    ):
+        recipes.setdefault(recipe.Dish_Name, recipe)
+    return recipes
+
+
+def lock_for_update(db):
+    """SQLite has no row locks (FOR UPDATE is dropped), so take its write lock up front instead.
+
+    Otherwise concurrent orders all read the same lot versions and all but one
+    lose the optimistic-version race. A no-op on other databases.
+    """
+    connection = db.connection()
+    if connection.dialect.name != "sqlite":
+        return
+    driver_connection = connection.connection.dbapi_connection
+    driver_connection = getattr(driver_connection, "_connection", driver_connection)  # Unwrap aiosqlite's adapter
+    if not driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def load_lots(db, item_names):
+    """Fetch and lock every lot for `item_names` in one FIFO-ordered query, grouped per ingredient.
+
+    Rows are locked in the same (Item_Name, Expiry_Date, Item_ID) order by every
+    transaction, so two orders sharing ingredients queue instead of deadlocking.
+    """
+    lots = defaultdict(list)
+    if not item_names:
+        return lots
+    lock_for_update(db)
+    for lot in (
+        db.query(models.InventoryItem)
+        .filter(models.InventoryItem.Item_Name.in_(sorted(item_names)))
+        .order_by(
+            models.InventoryItem.Item_Name,
+            models.InventoryItem.Expiry_Date,  # ✅ Oldest expiry first
+            models.InventoryItem.Item_ID,
+        )
+        .with_for_update()
+    ):
+        lots[lot.Item_Name].append(lot)
+    return lots
+
+
+def load_holds(db, item_names, now=None):
+    """Active (unexpired) reservations as {ingredient: {cart_id: quantity}}."""
+    holds = defaultdict(dict)
+    if not item_names:
+        return holds
+    now = now or datetime.now()
+    for name, cart_id, quantity in (
+        db.query(
+            models.StockReservation.Item_Name,
+            models.StockReservation.Cart_ID,
+            func.sum(models.StockReservation.Quantity),
+        )
+        .filter(
+            models.StockReservation.Item_Name.in_(sorted(item_names)),
+            models.StockReservation.Expires_At > now,
+        )
+        .group_by(models.StockReservation.Item_Name, models.StockReservation.Cart_ID)
+    ):
+        holds[name][cart_id] = quantity
+    return holds
+
+
+class OrderBook:
+    """Recipes, requirements and lots for a batch of orders, loaded in a constant number of queries."""
+
+    def __init__(self, db, orders):
+        dish_names = {dish_name for order in orders for dish_name in order.Items_Ordered}
+        self.recipes = load_recipes(db, dish_names)
+        self.requirements, self.base_units = ingredients.requirements_for(db, list(self.recipes.values()))
+        self.lots = load_lots(db, self.base_units)  # ✅ Locked until commit/rollback
+        self.holds = load_holds(db, self.base_units)
+
+    def held_by_others(self, ingredient, cart_id):
+        """Stock of `ingredient` reserved by carts other than `cart_id`."""
+        return sum(quantity for cart, quantity in self.holds.get(ingredient, {}).items() if cart != cart_id)
+
+    def plan(self, order):
+        """Work out the new quantity of every lot the order touches, without changing anything.
+
+        Returns ({lot: new_quantity}, {ingredient: base_quantity_needed}); raises
+        OrderError if the order can't be fulfilled.
+        """
+        staged = {}
+        needed = defaultdict(float)
+        cart_id = getattr(order, "Cart_ID", None)
+
+        for dish_name, quantity_ordered in order.Items_Ordered.items():
+            recipe = self.recipes.get(dish_name)
+            if not recipe:
+                raise OrderError(f"Recipe for '{dish_name}' not found")
+            try:
+                quantity_ordered = int(quantity_ordered)
+            except (TypeError, ValueError):
+                raise OrderError(f"Invalid quantity ordered for '{dish_name}'")
+
+            for ingredient, numeric_required_quantity in self.requirements[recipe.Recipe_ID]:
+                if numeric_required_quantity is None:
+                    raise OrderError(f"Invalid quantity format for ingredient '{ingredient}'")
+
+                required_total = numeric_required_quantity * quantity_ordered
+                inventory_items = self.lots.get(ingredient)
+                if not inventory_items:
+                    raise OrderError(f"Ingredient '{ingredient}' not found in inventory")
+
+                # ✅ Work in the ingredient's base unit (e.g. a lot stored in kg against a recipe in g)
+                in_base = []
+                for inventory_item in inventory_items:
+                    quantity = staged.get(inventory_item, inventory_item.Quantity)
+                    if quantity is None or quantity < 0:
+                        raise OrderError(f"Invalid inventory format for ingredient '{ingredient}'")
+                    factor = units.conversion_factor(inventory_item.Unit, self.base_units[ingredient])
+                    in_base.append((inventory_item, quantity * factor, factor))
+
+                # ✅ Stock held by other carts is off limits
+                available = sum(quantity for _, quantity, _ in in_base) - self.held_by_others(ingredient, cart_id)
+                if required_total > available + 1e-9:
+                    raise OrderError(
+                        f"Insufficient stock for ingredient '{ingredient}' "
+                        f"(Needed: {required_total}, Available: {max(available, 0)})"
+                    )
+                needed[ingredient] += required_total
+
+                remaining_needed = required_total
+                for inventory_item, current_quantity, factor in in_base:
+
+                    if current_quantity >= remaining_needed:
+                        staged[inventory_item] = (current_quantity - remaining_needed) / factor
+                        remaining_needed = 0  # ✅ Fully deducted
+                        break
+                    remaining_needed -= current_quantity
+                    staged[inventory_item] = 0  # ✅ Use up this stock
+
+        return staged, needed
+
+    def place(self, db, order):
+        """Deduct stock for one order in memory and queue its order/activity rows on the session.
+
+        Returns (CustomerOrder, [StockMovement], [DailyActivity]); the movements still
+        need the order's ID as their reference, see `record_sales`.
+        """
+        staged, _needed = self.plan(order)
+        movements = []
+        for inventory_item, quantity in staged.items():
+            if quantity != inventory_item.Quantity:
+                movements.append(ledger.movement(inventory_item, ledger.SALE, quantity - inventory_item.Quantity))
+            inventory_item.Quantity = quantity
+
+        # ✅ The order consumes its cart's holds
+        cart_id = getattr(order, "Cart_ID", None)
+        if cart_id:
+            release(db, cart_id)
+            for carts in self.holds.values():
+                carts.pop(cart_id, None)
+
+        new_order = models.CustomerOrder(
+            Customer_ID=order.Customer_ID,
+            Date_Time=order.Date_Time,
+            Items_Ordered=order.Items_Ordered,
+            Total_Bill=order.Total_Bill,
+            Order_Status=order.Order_Status
+        )
+        db.add(new_order)
+        activities = []
+        for dish_name, quantity_ordered in order.Items_Ordered.items():
+            activities.append(models.DailyActivity(
+                Date_Time=order.Date_Time,
+                Item_Name=dish_name,
+                Quantity_Sold=int(quantity_ordered),
+                Revenue=order.Total_Bill,
+                Customer_Count=1,
+                Weather_Condition=None,
+                Day_Type=get_day_type(order.Date_Time)
+            ))
+        db.add_all(activities)
+        return new_order, movements, activities
+
+
+def record_sales(db, placed):
+    """Append sale movements (referencing their Order_IDs), daily rollups and change-feed entries for placed orders.
+
+    One flush and one rollup upsert per batch.
+    """
+    db.flush()
+    for new_order, movements, _activities in placed:
+        for stock_movement in movements:
+            stock_movement.Reference = f"order:{new_order.Order_ID}"
+        db.add_all(movements)
+        changes.inserted(db, new_order)
+
+    # ✅ One change-feed patch per lot touched by the batch
+    for item_id in sorted({stock_movement.Item_ID for _order, movements, _activities in placed for stock_movement in movements}):
+        changes.updated(db, db.get(models.InventoryItem, item_id), ["Quantity"])
+    rollups.record(db, [activity for _order, _movements, activities in placed for activity in activities])
+
+
+def release(db, cart_id):
+    """Drop every hold of a cart."""
+    return (
+        db.query(models.StockReservation)
+        .filter(models.StockReservation.Cart_ID == cart_id)
+        .delete(synchronize_session=False)
+    )
+
+
+class Cart:
+    """The parts of an order that `OrderBook.plan` needs."""
+
+    def __init__(self, cart_id, items_ordered):
+        self.Cart_ID = cart_id
+        self.Items_Ordered = items_ordered
+
+
+def reserve(db, cart_id, items_ordered, ttl_seconds=None, now=None):
+    """Hold stock for a cart's dishes, replacing the cart's previous holds.
+
+    Returns (cart_id, expires_at, {ingredient: quantity}); raises OrderError if the
+    stock isn't there once other carts' holds are taken into account.
+    """
+    now = now or datetime.now()
+    cart_id = cart_id or uuid.uuid4().hex
+    expires_at = now + timedelta(seconds=ttl_seconds or RESERVATION_TTL_SECONDS)
+
+    cart = Cart(cart_id, items_ordered)
+    _staged, needed = OrderBook(db, [cart]).plan(cart)
+
+    db.query(models.StockReservation).filter(models.StockReservation.Expires_At <= now).delete(synchronize_session=False)
+    release(db, cart_id)
+    db.add_all([
+        models.StockReservation(Cart_ID=cart_id, Item_Name=name, Quantity=quantity, Expires_At=expires_at)
+        for name, quantity in needed.items()
+    ])
+    return cart_id, expires_at, dict(needed)
+
+
+def backoff(attempt):
+    """Full-jitter delay before retry number `attempt` (0-based), capped at ORDER_RETRY_MAX_SECONDS."""
+    return random.uniform(0, min(ORDER_RETRY_MAX_SECONDS, ORDER_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def transact(db, work, attempts=None):
+    """Run `work(db)` and commit, retrying lock conflicts with jittered backoff.
+
+    OrderError rolls back and propagates immediately; lost optimistic-version races
+    (StaleDataError) and lock/deadlock errors are retried on fresh data.
+    """
+    attempts = attempts or ORDER_RETRIES
+    for attempt in range(attempts):
+        try:
+            result = work(db)
+            db.commit()
+            return result
+        except OrderError:
+            db.rollback()
+            raise
+        except (StaleDataError, OperationalError):
+            db.rollback()
+            if attempt == attempts - 1:
+                raise
+            time.sleep(backoff(attempt))
+
+
+async def transact_async(db, work, attempts=None):
+    """`transact` for an AsyncSession: `work(session)` runs via run_sync, backoff doesn't block the loop."""
+    attempts = attempts or ORDER_RETRIES
+    for attempt in range(attempts):
+        try:
+            result = await db.run_sync(work)
+            await db.commit()
+            return result
+        except OrderError:
+            await db.rollback()
+            raise
+        except (StaleDataError, OperationalError):
+            await db.rollback()
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(backoff(attempt))
+
+
+def place_order(db, order):
+    """Place a single order; the caller commits, or rolls back on OrderError."""
+    record_sales(db, [OrderBook(db, [order]).place(db, order)])
+
+
+def place_orders(db, orders):
+    """Place a batch of orders against one shared snapshot of recipes and lots.
+
+    Each order is all-or-nothing; rejected orders leave stock untouched. Returns one
+    error message (or None) per order. The caller commits once for the whole batch.
+    """
+    book = OrderBook(db, orders)
+    placed = []
+    results = []
+    for order in orders:
+        try:
+            placed.append(book.place(db, order))
+            results.append(None)
+        except OrderError as e:
+            results.append(str(e))
+    record_sales(db, placed)
+    return results
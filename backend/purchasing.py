@@ -0,0 +1,167 @@
+"""Ingredient demand projection for purchasing (GET /forecast/ingredients/{n_days}).
+
+The dish forecast (dishes x days) is multiplied by the sparse recipe x
+ingredient requirement matrix from menu_engine, giving ingredient demand per
+day in base units. That demand is then drawn from current stock FIFO by
+expiry. Stock that expires before it is used is written off on the day it
+expires. What the stock can't cover becomes that day's shortfall. All
+ingredients are simulated together, one vector step per day.
+"""
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import fast_forecast
+import forecast_store
+import ingredients
+import menu_engine
+import models
+import rollups
+
+MODES = ("fast", "xgboost", "store")
+
+
+def dish_forecast(db, n_days, today, mode="fast"):
+    """(dish names, dishes x n_days predicted portions) from the chosen engine, or None.
+
+    "store" serves the persisted Prophet forecasts and is None when they don't cover n_days.
+    """
+    future = pd.date_range(start=today, periods=n_days)
+    if mode == "store":
+        stored = forecast_store.read(db, n_days, today)
+        if stored is None:
+            return None
+        frame = pd.DataFrame(stored[0])
+        if frame.empty:
+            return [], np.zeros((0, n_days))
+        pivot = frame.pivot_table(index="Item_Name", columns="Date", values="Predicted_Quantity", aggfunc="sum")
+        pivot = pivot.reindex(columns=future, fill_value=0).fillna(0)
+        return list(pivot.index), pivot.to_numpy(dtype=float)
+
+    if mode == "xgboost":
+        import xgb_forecast  # ✅ XGBoost (and scikit-learn) only when this mode is asked for
+
+        sales = rollups.sales_frame(db, start=today - timedelta(days=xgb_forecast.XGB_HISTORY_DAYS))
+        dishes, _, predictions = xgb_forecast.fit_predict(sales, n_days, today)
+        return dishes, predictions.astype(float)
+
+    dishes, dates, matrix = fast_forecast.history(db, today)
+    if not dishes:
+        return [], np.zeros((0, n_days))
+    return dishes, fast_forecast.forecast_matrix(matrix, dates, future).astype(float)
+
+
+def ingredient_demand(dish_names, portions, recipes, requirements):
+    """Sparse matmul of dish portions (dishes x days) by requirements: (ingredient names, ingredients x days, unmatched).
+
+    Dishes are matched to recipes by Dish_Name (first recipe wins); dishes
+    without a recipe, or whose recipe has an unparseable quantity, are returned
+    as unmatched.
+    """
+    names, ingredient_names, indptr, indices, data, invalid = menu_engine.compile_requirements(recipes, requirements)
+    row = {}
+    for i, dish_name in enumerate(names):
+        if not invalid[i]:
+            row.setdefault(dish_name, i)
+
+    n_days = portions.shape[1]
+    # ✅ Forecast dishes laid out in recipe-row order (zero rows for recipes without a forecast)
+    by_recipe = np.zeros((len(names), n_days))
+    unmatched = []
+    for dish_name, forecast in zip(dish_names, portions):
+        if dish_name in row:
+            by_recipe[row[dish_name]] = forecast
+        else:
+            unmatched.append(dish_name)
+
+    # ✅ demand[j, t] = sum_i data[i, j] * by_recipe[i, t] over the CSR entries
+    demand = np.zeros((len(ingredient_names), n_days))
+    row_ids = np.repeat(np.arange(len(names)), np.diff(indptr))
+    np.add.at(demand, indices, data[:, None] * by_recipe[row_ids])
+    return ingredient_names, demand, unmatched
+
+
+def stock_schedule(lots, ingredient_names, today, n_days):
+    """(total stock, ingredients x days cumulative quantity expired before each day) in base units.
+
+    A lot is usable through its expiry date; lots without one never expire.
+    """
+    total = np.zeros(len(ingredient_names))
+    expires = np.zeros((len(ingredient_names), n_days + 1))
+    for j, name in enumerate(ingredient_names):
+        for quantity, _, expiry in lots.get(name, []):
+            quantity = max(quantity or 0.0, 0.0)
+            total[j] += quantity
+            if expiry is not None:
+                day = min(max((expiry.date() - today).days + 1, 0), n_days)
+                expires[j, day] += quantity
+    return total, np.cumsum(expires, axis=1)[:, :n_days]
+
+
+def simulate(demand, total, expired):
+    """Draw demand from stock FIFO by expiry, one vector step per day for every ingredient.
+
+    Returns (available, expiring, shortfall), each ingredients x days.
+    """
+    n_ingredients, n_days = demand.shape
+    used = np.zeros(n_ingredients)  # Position on each ingredient's expiry-ordered stock curve
+    available = np.zeros_like(demand)
+    expiring = np.zeros_like(demand)
+    shortfall = np.zeros_like(demand)
+    for t in range(n_days):
+        written_off = np.maximum(expired[:, t] - used, 0.0)
+        used += written_off
+        available[:, t] = total - used
+        consumed = np.minimum(demand[:, t], available[:, t])
+        used += consumed
+        expiring[:, t] = written_off
+        shortfall[:, t] = demand[:, t] - consumed
+    return available, expiring, shortfall
+
+
+def project(db, n_days, today=None, mode="fast"):
+    """Per-day ingredient demand, shortfalls and reorder quantities for the whole catalogue.
+
+    Returns None when the chosen forecast isn't available.
+    """
+    today = today or datetime.now().date()
+    forecast = dish_forecast(db, n_days, today, mode)
+    if forecast is None:
+        return None
+    dish_names, portions = forecast
+
+    recipes = db.query(models.Recipe).order_by(models.Recipe.Recipe_ID).all()
+    requirements, base_units = ingredients.requirements_for(db, recipes)
+    lots = menu_engine.load_lots(db, base_units)
+
+    ingredient_names, demand, unmatched = ingredient_demand(dish_names, portions, recipes, requirements)
+    total, expired = stock_schedule(lots, ingredient_names, today, n_days)
+    available, expiring, shortfall = simulate(demand, total, expired)
+
+    dates = [today + timedelta(days=t) for t in range(n_days)]
+    projection = []
+    for j, name in enumerate(ingredient_names):
+        short_days = np.flatnonzero(shortfall[j] > 1e-9)
+        projection.append({
+            "Ingredient": name,
+            "Unit": base_units.get(name),
+            "Stock": round(float(total[j]), 3),
+            "Demand": round(float(demand[j].sum()), 3),
+            "Expiring": round(float(expiring[j].sum()), 3),
+            "Shortfall": round(float(shortfall[j].sum()), 3),
+            "Reorder_Quantity": math.ceil(shortfall[j].sum() - 1e-9),
+            "Reorder_By": dates[short_days[0]] if len(short_days) else None,
+            "Days": [
+                {
+                    "Date": dates[t],
+                    "Demand": round(float(demand[j, t]), 3),
+                    "Available": round(float(available[j, t]), 3),
+                    "Expiring": round(float(expiring[j, t]), 3),
+                    "Shortfall": round(float(shortfall[j, t]), 3),
+                }
+                for t in range(n_days)
+            ],
+        })
+    return {"Start": today, "Days": n_days, "Mode": mode, "Ingredients": projection, "Unmatched_Dishes": unmatched}
@@ -0,0 +1,176 @@
+"""Per item per day sales rollups (daily_sales), maintained on every DailyActivity insert.
+
+Forecasting and analytics read these compact aggregates instead of scanning
+daily_activity, so memory and load time scale with items x days. Rebuild a
+range from scratch (e.g. after a bulk import or manual fix) with:
+
+    python rollups.py rebuild [YYYY-MM-DD YYYY-MM-DD]
+"""
+import sys
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, insert, select
+
+import models
+from database import upsert
+
+ROLLUP_COLUMNS = [
+    "Item_Name",
+    "Date",
+    "Quantity_Sold",
+    "Revenue",
+    "Customer_Count",
+    "Order_Lines",
+    "Day_Type",
+    "Weather_Condition",
+]
+
+
+def aggregate(activities):
+    """Fold DailyActivity rows into rollup rows, sorted by (Item_Name, Date)."""
+    totals = {}
+    for activity in activities:
+        key = (activity.Item_Name, activity.Date_Time.date())
+        row = totals.get(key)
+        if row is None:
+            row = totals[key] = {
+                "Item_Name": key[0],
+                "Date": key[1],
+                "Quantity_Sold": 0,
+                "Revenue": 0.0,
+                "Customer_Count": 0,
+                "Order_Lines": 0,
+                "Day_Type": None,
+                "Weather_Condition": None,
+            }
+        row["Quantity_Sold"] += int(activity.Quantity_Sold or 0)
+        row["Revenue"] += float(activity.Revenue or 0.0)
+        row["Customer_Count"] += int(activity.Customer_Count or 0)
+        row["Order_Lines"] += 1
+        row["Day_Type"] = activity.Day_Type or row["Day_Type"]
+        row["Weather_Condition"] = activity.Weather_Condition or row["Weather_Condition"]
+    return [totals[key] for key in sorted(totals)]
+
+
+def aggregate_frame(frame):
+    """Vectorized `aggregate` for a DataFrame with DailyActivity columns (e.g. an import chunk)."""
+    if frame.empty:
+        return []
+    totals = (
+        frame.assign(Date=frame["Date_Time"].dt.date)
+        .groupby(["Item_Name", "Date"], sort=True)
+        .agg(
+            Quantity_Sold=("Quantity_Sold", "sum"),
+            Revenue=("Revenue", "sum"),
+            Customer_Count=("Customer_Count", "sum"),
+            Order_Lines=("Item_Name", "size"),
+            Day_Type=("Day_Type", "last"),
+            Weather_Condition=("Weather_Condition", "last"),
+        )
+        .reset_index()[ROLLUP_COLUMNS]
+    )
+    totals = totals.astype(object).where(totals.notna(), None)
+    return [
+        dict(row, Quantity_Sold=int(row["Quantity_Sold"]), Revenue=float(row["Revenue"]),
+             Customer_Count=int(row["Customer_Count"]), Order_Lines=int(row["Order_Lines"]))
+        for row in totals.to_dict(orient="records")
+    ]
+
+
+def add_rows(db, rows):
+    """Upsert pre-aggregated rollup rows, adding to any existing totals (one statement)."""
+    if not rows:
+        return
+    table = models.DailySales.__table__
+    statement = upsert(db.get_bind(), table).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.Item_Name, table.c.Date],
+        set_={
+            "Quantity_Sold": table.c.Quantity_Sold + statement.excluded.Quantity_Sold,
+            "Revenue": table.c.Revenue + statement.excluded.Revenue,
+            "Customer_Count": table.c.Customer_Count + statement.excluded.Customer_Count,
+            "Order_Lines": table.c.Order_Lines + statement.excluded.Order_Lines,
+            "Day_Type": func.coalesce(statement.excluded.Day_Type, table.c.Day_Type),
+            "Weather_Condition": func.coalesce(statement.excluded.Weather_Condition, table.c.Weather_Condition),
+        },
+    )
+    db.execute(statement)
+
+
+def record(db, activities):
+    """Add new DailyActivity rows to their rollups in the caller's transaction.
+
+    Rows are upserted in (Item_Name, Date) order so concurrent writers lock them consistently.
+    """
+    add_rows(db, aggregate(activities))
+
+
+def rebuild(db, start=None, end=None):
+    """Recompute rollups for [start, end] (dates, inclusive; default everything) with one INSERT ... SELECT."""
+    day = func.date(models.DailyActivity.Date_Time)
+    source = select(
+        models.DailyActivity.Item_Name,
+        day.label("Date"),
+        func.sum(models.DailyActivity.Quantity_Sold),
+        func.sum(models.DailyActivity.Revenue),
+        func.sum(models.DailyActivity.Customer_Count),
+        func.count(models.DailyActivity.Order_ID),
+        func.max(models.DailyActivity.Day_Type),
+        func.max(models.DailyActivity.Weather_Condition),
+    ).group_by(models.DailyActivity.Item_Name, day)
+
+    existing = db.query(models.DailySales)
+    if start is not None:
+        source = source.where(models.DailyActivity.Date_Time >= datetime.combine(start, time.min))
+        existing = existing.filter(models.DailySales.Date >= start)
+    if end is not None:
+        source = source.where(models.DailyActivity.Date_Time < datetime.combine(end + timedelta(days=1), time.min))
+        existing = existing.filter(models.DailySales.Date <= end)
+
+    existing.delete(synchronize_session=False)
+    result = db.execute(insert(models.DailySales).from_select(ROLLUP_COLUMNS, source))
+    return result.rowcount
+
+
+def sales_frame(db, items=None, start=None):
+    """Rollups as a DataFrame with one row per item per day that had sales."""
+    import pandas as pd  # ✅ Loaded by analytics callers only, not by every order write
+
+    query = select(*(getattr(models.DailySales, column) for column in ROLLUP_COLUMNS))
+    if items is not None:
+        query = query.where(models.DailySales.Item_Name.in_(sorted(items)))
+    if start is not None:
+        query = query.where(models.DailySales.Date >= start)
+    frame = pd.read_sql(query.order_by(models.DailySales.Item_Name, models.DailySales.Date), db.connection())
+    frame["Date"] = pd.to_datetime(frame["Date"])
+    return frame
+
+
+def sales_matrix(frame, end=None):
+    """Pivot a sales frame into (items, dates, quantities) with an items x days float matrix.
+
+    Days without sales are zero; the date range runs from the first sale to `end`
+    (default: the last sale).
+    """
+    import numpy as np
+    import pandas as pd
+
+    if frame.empty:
+        return [], pd.DatetimeIndex([]), np.zeros((0, 0))
+    pivot = frame.pivot_table(index="Item_Name", columns="Date", values="Quantity_Sold", aggfunc="sum", fill_value=0)
+    dates = pd.date_range(frame["Date"].min(), pd.Timestamp(end) if end is not None else frame["Date"].max(), freq="D")
+    pivot = pivot.reindex(columns=dates, fill_value=0)
+    return list(pivot.index), dates, pivot.to_numpy(dtype=float)
+
+
+if __name__ == "__main__":
+    if not sys.argv[1:] or sys.argv[1] != "rebuild":
+        raise SystemExit("Usage: python rollups.py rebuild [YYYY-MM-DD YYYY-MM-DD]")
+
+    from database import SessionLocal
+
+    bounds = [date.fromisoformat(value) for value in sys.argv[2:4]]
+    with SessionLocal() as db:
+        written = rebuild(db, *bounds)
+        db.commit()
+    print(f"✅ Rebuilt {written} daily sales row(s)")
@@ -0,0 +1,71 @@
+"""Quantity parsing and unit conversion for recipe ingredients and inventory lots."""
+import re
+
+# ✅ unit -> (canonical base unit, factor to base)
+UNIT_CONVERSIONS = {
+    "mg": ("g", 0.001),
+    "g": ("g", 1.0),
+    "gm": ("g", 1.0),
+    "gms": ("g", 1.0),
+    "gram": ("g", 1.0),
+    "grams": ("g", 1.0),
+    "kg": ("g", 1000.0),
+    "kgs": ("g", 1000.0),
+    "oz": ("g", 28.3495),
+    "lb": ("g", 453.592),
+    "lbs": ("g", 453.592),
+    "ml": ("ml", 1.0),
+    "cl": ("ml", 10.0),
+    "dl": ("ml", 100.0),
+    "l": ("ml", 1000.0),
+    "liter": ("ml", 1000.0),
+    "liters": ("ml", 1000.0),
+    "litre": ("ml", 1000.0),
+    "litres": ("ml", 1000.0),
+    "tsp": ("ml", 5.0),
+    "tbsp": ("ml", 15.0),
+    "cup": ("ml", 240.0),
+    "cups": ("ml", 240.0),
+    "": ("pcs", 1.0),
+    "pc": ("pcs", 1.0),
+    "pcs": ("pcs", 1.0),
+    "piece": ("pcs", 1.0),
+    "pieces": ("pcs", 1.0),
+    "unit": ("pcs", 1.0),
+    "units": ("pcs", 1.0),
+    "dozen": ("pcs", 12.0),
+}
+
+QUANTITY_PATTERN = re.compile(r"^\s*(\d+(?:\.\d*)?|\.\d+)\s*([a-zA-Z]*)")
+
+
+def normalize_unit(unit):
+    """Map a unit string to (base_unit, factor); unknown units are their own base."""
+    unit = (unit or "").strip().lower()
+    return UNIT_CONVERSIONS.get(unit, (unit, 1.0))
+
+
+def parse_quantity(value):
+    """Parse a quantity such as '100g', '1.5 kg' or 2 into (amount_in_base_unit, base_unit).
+
+    Returns None when no leading number can be found.
+    """
+    match = QUANTITY_PATTERN.match(str(value))
+    if not match:
+        return None
+    base_unit, factor = normalize_unit(match.group(2))
+    return float(match.group(1)) * factor, base_unit
+
+
+def conversion_factor(unit, base_unit):
+    """Factor that turns an amount in `unit` into `base_unit`.
+
+    Incompatible or unknown units fall back to 1.0, i.e. the raw number is used as-is.
+    """
+    unit_base, factor = normalize_unit(unit)
+    return factor if unit_base == base_unit else 1.0
+
+
+def canonical_name(name):
+    """Canonical ingredient name: trimmed with inner whitespace collapsed."""
+    return " ".join(str(name).split())
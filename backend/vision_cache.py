@@ -0,0 +1,250 @@
+"""Result cache for /analyze-food, keyed by exact content and by perceptual hash.
+
+Camera clients send near-identical frames over and over, and each one would
+be a paid Gemini call. A frame is looked up in this order:
+
+1. Its SHA-256 in the in-memory LRU. This is the microsecond path for a
+   frame that's byte-for-byte unchanged.
+2. Its perceptual hash (dHash, or pHash with VISION_HASH=phash) within
+   VISION_HASH_DISTANCE bits (Hamming distance) of a remembered frame.
+3. The same two checks against the on-disk store (SQLite at
+   VISION_CACHE_PATH). This store survives restarts and is shared by
+   workers.
+
+Entries expire VISION_CACHE_TTL_SECONDS after they were stored. The memory
+tier keeps the VISION_CACHE_SIZE most recently used entries. Set
+VISION_CACHE_PATH="" to keep only the memory tier, or
+VISION_HASH_DISTANCE=-1 to match exact content only.
+
+The memory tier is guarded by a lock. The disk tier is not: each thread has
+its own SQLite connection, and WAL lets them read while another one writes.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+VISION_CACHE_PATH = os.getenv("VISION_CACHE_PATH", "vision_cache.sqlite3")
+VISION_CACHE_SIZE = int(os.getenv("VISION_CACHE_SIZE", "512"))
+VISION_CACHE_TTL_SECONDS = float(os.getenv("VISION_CACHE_TTL_SECONDS", "3600"))
+VISION_HASH = os.getenv("VISION_HASH", "dhash")  # dhash or phash
+VISION_HASH_DISTANCE = int(os.getenv("VISION_HASH_DISTANCE", "4"))  # Max differing bits of 64
+PRUNE_EVERY = 100  # Stores between sweeps of expired rows on disk
+
+logger = logging.getLogger(__name__)
+
+_memory = OrderedDict()  # sha256 -> (perceptual hash, result, stored_at)
+_lock = threading.Lock()  # Guards _memory, _stats and _stores; never held during disk I/O
+_local = threading.local()  # One SQLite connection per thread
+_stores = 0
+_stats = {"exact_hits": 0, "similar_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+
+def digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def _grayscale(content, size):
+    image = Image.open(io.BytesIO(content))
+    image.draft("L", (size[0] * 4, size[1] * 4))  # ✅ JPEGs decode at a fraction of full size
+    return np.asarray(image.convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def _pack(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(content):
+    """64-bit difference hash: is each pixel brighter than its right-hand neighbour (9x8 grayscale)."""
+    pixels = _grayscale(content, (9, 8))
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_basis(size, keep):
+    """The first `keep` rows of the orthonormal DCT-II matrix for `size` samples."""
+    k = np.arange(keep)[:, None]
+    n = np.arange(size)[None, :]
+    basis = np.sqrt(2 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    basis[0] /= np.sqrt(2)
+    return basis.astype(np.float32)
+
+
+_DCT_32_LOW_8 = _dct_basis(32, 8)
+
+
+def phash(content):
+    """64-bit perceptual hash: low 8x8 DCT frequencies of a 32x32 grayscale, against their median."""
+    low = _DCT_32_LOW_8 @ _grayscale(content, (32, 32)) @ _DCT_32_LOW_8.T  # ✅ Only the 8x8 corner of the 2-D DCT
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+def perceptual_hash(content):
+    """The configured perceptual hash, or None when the content isn't a readable image."""
+    try:
+        return phash(content) if VISION_HASH == "phash" else dhash(content)
+    except Exception as e:
+        logger.warning("Perceptual hash (%s) failed, matching exact content only: %r", VISION_HASH, e)
+        return None
+
+
+def distances(hashes, target):
+    """Hamming distance from `target` to each of `hashes` (64-bit ints), vectorized."""
+    xor = np.array(hashes, dtype=np.uint64) ^ np.uint64(target)
+    return np.unpackbits(xor.view(np.uint8)).reshape(len(hashes), 64).sum(axis=1)
+
+
+def _closest(candidates, target):
+    """(key, distance) of the nearest candidate within VISION_HASH_DISTANCE, else None."""
+    if target is None or VISION_HASH_DISTANCE < 0 or not candidates:
+        return None
+    keys, hashes = zip(*candidates)
+    found = distances(hashes, target)
+    best = int(found.argmin())
+    return (keys[best], int(found[best])) if found[best] <= VISION_HASH_DISTANCE else None
+
+
+def _connection():
+    """This thread's connection to the disk tier, opened (and the table created) on first use."""
+    db = getattr(_local, "db", None)
+    if db is None:
+        db = _local.db = sqlite3.connect(VISION_CACHE_PATH, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS vision_cache "
+            "(sha256 TEXT PRIMARY KEY, perceptual INTEGER, result TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS ix_vision_cache_stored_at ON vision_cache (stored_at)")
+    return db
+
+
+def _signed(value):
+    """SQLite integers are signed 64-bit."""
+    return None if value is None else value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value):
+    return None if value is None else value + (1 << 64) if value < 0 else value
+
+
+def _remember(sha, perceptual, result, stored_at):
+    """Put an entry in the memory tier (caller holds the lock)."""
+    _memory[sha] = (perceptual, result, stored_at)
+    _memory.move_to_end(sha)
+    while len(_memory) > VISION_CACHE_SIZE:
+        _memory.popitem(last=False)
+        _stats["evictions"] += 1
+
+
+def recall(sha):
+    """Exact-content hit from the memory tier, or None (the no-decode, no-I/O fast path)."""
+    with _lock:
+        entry = _memory.get(sha)
+        if entry is None:
+            return None
+        if time.time() - entry[2] > VISION_CACHE_TTL_SECONDS:
+            del _memory[sha]
+            _stats["expired"] += 1
+            return None
+        _memory.move_to_end(sha)
+        _stats["exact_hits"] += 1
+        return entry[1]
+
+
+def lookup(content, sha=None):
+    """(result or None, how it matched, perceptual hash) for an uploaded frame."""
+    sha = sha or digest(content)
+    result = recall(sha)
+    if result is not None:
+        return result, "exact", None
+
+    perceptual = perceptual_hash(content)
+    cutoff = time.time() - VISION_CACHE_TTL_SECONDS
+    with _lock:
+        fresh = [(key, entry[0]) for key, entry in _memory.items() if entry[2] >= cutoff and entry[0] is not None]
+    match = _closest(fresh, perceptual)
+    if match is not None:
+        with _lock:
+            entry = _memory.get(match[0])  # May have been evicted while we compared
+            if entry is not None:
+                _memory.move_to_end(match[0])
+                _stats["similar_hits"] += 1
+                return entry[1], f"similar:{match[1]}", perceptual
+
+    if VISION_CACHE_PATH:
+        # ✅ Outside the lock: a slow disk scan mustn't stall memory hits on other threads
+        db = _connection()
+        row = db.execute(
+            "SELECT perceptual, result, stored_at FROM vision_cache WHERE sha256 = ? AND stored_at >= ?", (sha, cutoff)
+        ).fetchone()
+        how = "disk"
+        if row is None and perceptual is not None and VISION_HASH_DISTANCE >= 0:
+            rows = db.execute(
+                "SELECT sha256, perceptual FROM vision_cache WHERE stored_at >= ? AND perceptual IS NOT NULL", (cutoff,)
+            ).fetchall()
+            match = _closest([(key, _unsigned(value)) for key, value in rows], perceptual)
+            if match is not None:
+                row = db.execute(
+                    "SELECT perceptual, result, stored_at FROM vision_cache WHERE sha256 = ?", (match[0],)
+                ).fetchone()
+                how = f"disk-similar:{match[1]}"
+        if row is not None:
+            result = json.loads(row[1])
+            with _lock:
+                _remember(sha, _unsigned(row[0]), result, row[2])
+                _stats["disk_hits"] += 1
+            return result, how, perceptual
+
+    with _lock:
+        _stats["misses"] += 1
+    return None, "miss", perceptual
+
+
+def store(content, result, sha=None, perceptual=None):
+    """Cache a fresh result for `content` in both tiers."""
+    global _stores
+    sha = sha or digest(content)
+    if perceptual is None:
+        perceptual = perceptual_hash(content)
+    now = time.time()
+    with _lock:
+        _remember(sha, perceptual, result, now)
+        _stats["stores"] += 1
+        if not VISION_CACHE_PATH:
+            return
+        _stores += 1
+        prune = _stores % PRUNE_EVERY == 0
+
+    db = _connection()
+    db.execute(
+        "INSERT OR REPLACE INTO vision_cache (sha256, perceptual, result, stored_at) VALUES (?, ?, ?, ?)",
+        (sha, _signed(perceptual), json.dumps(result), now),
+    )
+    if prune:
+        removed = db.execute("DELETE FROM vision_cache WHERE stored_at < ?", (now - VISION_CACHE_TTL_SECONDS,)).rowcount
+        with _lock:
+            _stats["expired"] += removed
+
+
+def stats():
+    """Hit/miss counters since the process started, plus tier sizes."""
+    with _lock:
+        hits = _stats["exact_hits"] + _stats["similar_hits"] + _stats["disk_hits"]
+        lookups = hits + _stats["misses"]
+        return dict(
+            _stats,
+            hit_rate=round(hits / lookups, 3) if lookups else None,
+            memory_entries=len(_memory),
+            memory_size=VISION_CACHE_SIZE,
+            disk_path=VISION_CACHE_PATH or None,
+            hash=VISION_HASH,
+            max_distance=VISION_HASH_DISTANCE,
+            ttl_seconds=VISION_CACHE_TTL_SECONDS,
+        )
@@ -0,0 +1,187 @@
+"""One global XGBoost demand model for every item (GET /forecast/{n_days}?mode=xgboost).
+
+Instead of one model per item, a single gradient-boosted regressor is trained
+on rows sampled from all items' daily_sales history, so fit time depends on
+XGB_MAX_TRAIN_ROWS rather than on the size of the menu. It is a direct
+multi-horizon model: each row describes a forecast origin (lags and rolling
+means up to that day), how far ahead the target is, the target day's
+calendar/Day_Type/Weather_Condition and a small per-item embedding (scale,
+weekend lift, volatility). Quantities are divided by the item's scale so
+dishes of very different volumes share trees. Predicting every item for
+every requested day is one batched `predict` call.
+"""
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from xgboost import XGBRegressor
+
+import orders
+import rollups
+
+XGB_HISTORY_DAYS = int(os.getenv("XGB_HISTORY_DAYS", "365"))
+XGB_MAX_TRAIN_ROWS = int(os.getenv("XGB_MAX_TRAIN_ROWS", "100000"))
+XGB_PARAMS = {
+    "n_estimators": 200,
+    "max_depth": 6,
+    "learning_rate": 0.08,
+    "subsample": 0.8,
+    "tree_method": "hist",
+    "n_jobs": int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 1))),
+    "random_state": 0,
+}
+LAGS = (1, 2, 3, 7, 14)  # Days back from the forecast origin
+WINDOWS = (7, 28)  # Rolling means ending at the origin
+DAY_TYPES = ["Weekday", "Weekend", "Holiday"]
+WARMUP_DAYS = max(max(LAGS), max(WINDOWS))
+
+
+def calendar(sales, dates):
+    """Per-date Day_Type and Weather_Condition codes, shared by all items.
+
+    The first value recorded for a day wins; days nobody logged fall back to
+    get_day_type and an "unknown" weather code. Returns (day_type, weather) float arrays.
+    """
+    daily = sales.dropna(subset=["Day_Type"]).groupby("Date")["Day_Type"].first()
+    day_type = pd.Series([orders.get_day_type(day) for day in dates], index=dates)
+    day_type.update(daily)
+
+    weather = sales.dropna(subset=["Weather_Condition"]).groupby("Date")["Weather_Condition"].first()
+    weather_names = sorted(weather.unique())
+    weather_codes = weather.map({name: code for code, name in enumerate(weather_names)})
+    weather_codes = weather_codes.reindex(dates).fillna(-1)
+
+    day_type_codes = day_type.map({name: code for code, name in enumerate(DAY_TYPES)}).fillna(-1)
+    return day_type_codes.to_numpy(dtype=float), weather_codes.to_numpy(dtype=float)
+
+
+def embeddings(matrix, first, weekend):
+    """(items x 3) item embedding plus each item's scale: log scale, weekend lift, volatility."""
+    observed = np.arange(matrix.shape[1])[None, :] >= first[:, None]
+    days = np.maximum(observed.sum(axis=1), 1)
+    mean = (matrix * observed).sum(axis=1) / days
+    scale = mean + 1.0
+
+    weekend_days = observed & weekend[None, :]
+    weekday_days = observed & ~weekend[None, :]
+    weekend_mean = (matrix * weekend_days).sum(axis=1) / np.maximum(weekend_days.sum(axis=1), 1)
+    weekday_mean = (matrix * weekday_days).sum(axis=1) / np.maximum(weekday_days.sum(axis=1), 1)
+    variance = ((matrix - mean[:, None]) ** 2 * observed).sum(axis=1) / days
+
+    embedding = np.column_stack([np.log(scale), (weekend_mean + 1.0) / (weekday_mean + 1.0), np.sqrt(variance) / scale])
+    return embedding, scale
+
+
+def features(scaled, cumulative, item, origin, horizon, target_day_type, target_weather, target_dayofweek, embedding):
+    """Feature matrix for (item, origin, horizon) row arrays; targets are described by the target_* arrays."""
+    columns = [scaled[item, origin + 1 - lag] for lag in LAGS]
+    columns += [(cumulative[item, origin + 1] - cumulative[item, origin + 1 - window]) / window for window in WINDOWS]
+    columns += [horizon, target_dayofweek, target_dayofweek >= 5, target_day_type, target_weather]
+    return np.column_stack(columns + [embedding[item]]).astype(np.float32)
+
+
+def fit(sales, max_horizon, seed=0):
+    """Train the global model on a `rollups.sales_frame` for horizons up to `max_horizon` days.
+
+    Returns the fitted state for `predict`, or None when there are no items.
+    """
+    items, dates, matrix = rollups.sales_matrix(sales)
+    if not items:
+        return None
+
+    n_items, n_days_seen = matrix.shape
+    first = (matrix > 0).argmax(axis=1)
+    dayofweek = dates.dayofweek.to_numpy()
+    embedding, scale = embeddings(matrix, first, dayofweek >= 5)
+
+    # ✅ Pad with zeros so lags/windows before the first recorded day are defined
+    scaled = np.hstack([np.zeros((n_items, WARMUP_DAYS)), matrix / scale[:, None]])
+    cumulative = np.hstack([np.zeros((n_items, 1)), np.cumsum(scaled, axis=1)])
+    day_type, weather = calendar(sales, dates)
+    state = {
+        "items": items,
+        "last_date": dates[-1],
+        "scaled": scaled,
+        "cumulative": cumulative,
+        "embedding": embedding,
+        "scale": scale,
+        "weather": weather[-1],
+        "model": None,
+    }
+
+    # ✅ Sample (item, origin, horizon) rows uniformly, capped so fit time doesn't grow with the menu
+    rng = np.random.default_rng(seed)
+    n_rows = min(XGB_MAX_TRAIN_ROWS, n_items * n_days_seen * min(max_horizon, n_days_seen))
+    item = rng.integers(0, n_items, n_rows)
+    horizon = rng.integers(1, min(max_horizon, max(n_days_seen - 1, 1)) + 1, n_rows)
+    low = first[item]
+    high = n_days_seen - 1 - horizon
+    keep = low <= high
+    item, horizon, low, high = item[keep], horizon[keep], low[keep], high[keep]
+    origins = low + (rng.random(len(item)) * (high - low + 1)).astype(int)
+    target = origins + horizon
+    if not len(item):
+        return state  # Too little history for any (origin, horizon) pair
+
+    state["model"] = XGBRegressor(**XGB_PARAMS)
+    state["model"].fit(
+        features(
+            scaled, cumulative, item, origins + WARMUP_DAYS, horizon,
+            day_type[target], weather[target], dayofweek[target], embedding,
+        ),
+        matrix[item, target] / scale[item],
+    )
+    return state
+
+
+def predict(state, future):
+    """Integer predictions (items x len(future)) for `future` dates after the last recorded day."""
+    n_items, n_days = len(state["items"]), len(future)
+    if state["model"] is None:
+        # ✅ No trained model: fall back to each item's mean
+        return np.tile(np.rint(state["scale"] - 1.0).astype(int)[:, None], (1, n_days))
+
+    # ✅ Forecasts start from the last recorded day; future Day_Type comes from the
+    # calendar and weather persists from the last recorded day
+    origin = state["scaled"].shape[1] - 1
+    horizons = (future - state["last_date"]).days.to_numpy()
+    future_day_type = np.array([DAY_TYPES.index(orders.get_day_type(day)) for day in future], dtype=float)
+    item = np.repeat(np.arange(n_items), n_days)
+    prediction = state["model"].predict(features(
+        state["scaled"], state["cumulative"], item, np.full(len(item), origin), np.tile(horizons, n_items),
+        np.tile(future_day_type, n_items), np.full(len(item), state["weather"]),
+        np.tile(future.dayofweek.to_numpy(), n_items), state["embedding"],
+    ))
+    prediction = np.clip(np.rint(prediction * state["scale"][item]), 0, None).astype(int)
+    return prediction.reshape(n_items, n_days)
+
+
+def fit_predict(sales, n_days, today, seed=0):
+    """Train on a `rollups.sales_frame` and predict `n_days` from `today` for every item.
+
+    Returns (items, future dates, items x n_days integer predictions).
+    """
+    future = pd.date_range(start=today, periods=n_days)
+    if sales.empty:
+        return [], future, np.zeros((0, n_days), dtype=int)
+    max_horizon = int((future[-1] - sales["Date"].max()).days)
+    state = fit(sales, max_horizon, seed)
+    return state["items"], future, predict(state, future)
+
+
+def forecast(db, n_days, today):
+    """Global-model forecasts for every item with sales in the last XGB_HISTORY_DAYS.
+
+    Returns records shaped like the Prophet endpoint's (Date, Predicted_Quantity, Item_Name).
+    """
+    sales = rollups.sales_frame(db, start=today - timedelta(days=XGB_HISTORY_DAYS))
+    items, future, predictions = fit_predict(sales, n_days, today)
+    if not items:
+        return []
+    frame = pd.DataFrame({
+        "Date": np.tile(future.to_numpy(), len(items)),
+        "Predicted_Quantity": predictions.ravel(),
+        "Item_Name": np.repeat(items, n_days),
+    })
+    return frame.to_dict(orient="records")
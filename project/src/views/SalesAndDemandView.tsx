@@ -11,7 +11,7 @@ const SalesAndDemandView = () => {
     setLoading(true);
     setError("");
     try {
-      const response = await fetch(`http://127.0.0.1:8000/forecast/${days}`);
+      const response = await fetch(`http://127.0.0.1:8000/forecast/${days}?mode=fast`);
       if (!response.ok) throw new Error("Failed to fetch data");
       
       const data = await response.json();